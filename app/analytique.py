@@ -0,0 +1,156 @@
+"""
+Statistiques de consommation et prévision des jours de stock
+
+Les retraits (table consommations) sont chargés en colonnes NumPy
+(produit_id, quantite, horodatage) et agrégés pour tous les produits à la
+fois, sans boucle par produit :
+- matrice produits × jours des quantités consommées sur la fenêtre
+- taux journalier moyen sur la fenêtre et moyenne mobile des derniers jours
+- jours de stock restants = stock / taux
+- quantité qui périmera avant d'être consommée au rythme actuel (ordre FEFO)
+
+Les taux ne dépendent que des événements : ils sont mis en cache jusqu'à
+l'arrivée d'un nouvel événement (ou le changement de jour).
+"""
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, select
+
+from app.models import Article, Consommation, Produit
+
+_verrou = threading.Lock()
+_cache_taux = {"cle": None, "valeur": None}
+
+def _taux_consommation(db, fenetre_jours, moyenne_jours, maintenant):
+    """(produit_ids, taux sur la fenêtre, moyenne mobile) ; en cache par dernier événement"""
+    dernier_id = db.execute(select(func.max(Consommation.id))).scalar()
+    cle = (dernier_id, fenetre_jours, moyenne_jours, maintenant.date())
+
+    with _verrou:
+        if _cache_taux["cle"] == cle:
+            return _cache_taux["valeur"]
+
+    debut = datetime.combine(maintenant.date(), datetime.min.time()) - timedelta(days=fenetre_jours - 1)
+    lignes = db.execute(
+        select(Consommation.produit_id, Consommation.quantite, Consommation.horodatage)
+        .where(Consommation.horodatage >= debut)
+    ).all()
+
+    if lignes:
+        produit_ids, quantites, horodatages = zip(*lignes)
+        produit_ids = np.array(produit_ids, dtype=np.int64)
+        quantites = np.array(quantites, dtype=np.float64)
+        jours = (np.array(horodatages, dtype="datetime64[D]") - np.datetime64(debut.date())).astype(np.int64)
+    else:
+        produit_ids = np.empty(0, dtype=np.int64)
+        quantites = np.empty(0)
+        jours = np.empty(0, dtype=np.int64)
+
+    produits, indices = np.unique(produit_ids, return_inverse=True)
+    jours = np.clip(jours, 0, fenetre_jours - 1)
+
+    # Quantité consommée par produit et par jour (dernière colonne = aujourd'hui)
+    matrice = np.zeros((len(produits), fenetre_jours))
+    np.add.at(matrice, (indices, jours), quantites)
+
+    taux = matrice.sum(axis=1) / fenetre_jours
+    moyenne_mobile = matrice[:, -moyenne_jours:].mean(axis=1)
+    valeur = (produits, taux, moyenne_mobile)
+
+    with _verrou:
+        _cache_taux["cle"] = cle
+        _cache_taux["valeur"] = valeur
+    return valeur
+
+def _stock(db, maintenant):
+    """Articles en stock en colonnes : produit_id, quantite, jours avant péremption (inf si aucune)"""
+    lignes = db.execute(
+        select(Article.produit_id, Article.quantite, Article.date_peremption)
+        .where(Article.quantite > 0)
+    ).all()
+    if not lignes:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+
+    produit_ids, quantites, dates = zip(*lignes)
+    dates = np.array(dates, dtype="datetime64[s]")  # None -> NaT
+    jours_restants = (dates - np.datetime64(maintenant, "s")) / np.timedelta64(1, "D")
+    jours_restants[np.isnat(dates)] = np.inf
+    return (
+        np.array(produit_ids, dtype=np.int64),
+        np.array(quantites, dtype=np.float64),
+        jours_restants
+    )
+
+def previsions(db, fenetre_jours=30, moyenne_jours=7, maintenant=None):
+    """Statistiques par produit (produits consommés récemment ou en stock)"""
+    maintenant = maintenant or datetime.utcnow()
+    moyenne_jours = min(moyenne_jours, fenetre_jours)
+
+    produits_evt, taux_evt, moyenne_evt = _taux_consommation(db, fenetre_jours, moyenne_jours, maintenant)
+    stock_pid, stock_qte, stock_jours = _stock(db, maintenant)
+
+    # Univers : produits consommés ou en stock
+    produits = np.union1d(produits_evt, stock_pid)
+    taux = np.zeros(len(produits))
+    moyenne = np.zeros(len(produits))
+    position = np.searchsorted(produits, produits_evt)
+    taux[position] = taux_evt
+    moyenne[position] = moyenne_evt
+
+    idx = np.searchsorted(produits, stock_pid)
+    stock = np.bincount(idx, weights=stock_qte, minlength=len(produits))
+
+    # Ordre FEFO par produit et quantité cumulée Q_i (articles 1..i du produit)
+    ordre = np.lexsort((stock_jours, idx))
+    idx_t, qte_t, jours_t = idx[ordre], stock_qte[ordre], stock_jours[ordre]
+    cumul = np.cumsum(qte_t) - qte_t
+    premiers = np.r_[True, idx_t[1:] != idx_t[:-1]] if len(idx_t) else np.empty(0, dtype=bool)
+    avant = cumul - np.maximum.accumulate(np.where(premiers, cumul, 0)) if len(idx_t) else cumul
+    cumul_inclus = avant + qte_t
+
+    # Consommation cumulée possible avant chaque péremption : C_i = taux × jours
+    # (infinie sans date). Les unités périmées sont jetées, pas mangées :
+    # D_i = min(D_i-1 + q_i, C_i) = Q_i + min(0, min_{k<=i}(C_k - Q_k))
+    with np.errstate(invalid="ignore"):
+        plafond = np.where(np.isinf(jours_t), np.inf, taux[idx_t] * np.maximum(jours_t, 0))
+    marge = plafond - cumul_inclus
+    if len(idx_t):
+        # Minimum cumulé par produit : décalage décroissant d'un produit à l'autre
+        # pour que les produits précédents ne l'influencent pas
+        finies = np.abs(marge[np.isfinite(marge)])
+        ecart = 2 * (finies.max() if len(finies) else 0) + 1
+        decalage = -idx_t * ecart
+        marge_min = np.minimum.accumulate(marge + decalage) - decalage
+    else:
+        marge_min = marge
+    consomme = cumul_inclus + np.minimum(0, marge_min)
+    consomme_avant = np.where(premiers, 0, np.r_[0, consomme[:-1]]) if len(idx_t) else consomme
+
+    # Unités de chaque article consommées avant sa péremption au rythme actuel
+    consommables = consomme - consomme_avant
+    a_risque = np.bincount(idx_t, weights=qte_t - consommables, minlength=len(produits))
+
+    with np.errstate(divide="ignore"):
+        jours_stock = np.where(taux > 0, stock / np.where(taux > 0, taux, 1), np.inf)
+
+    noms = dict(db.execute(
+        select(Produit.id, Produit.nom).where(Produit.id.in_(produits.tolist()))
+    ).all())
+
+    resultat = [
+        {
+            "produit_id": int(pid),
+            "nom": noms.get(int(pid)),
+            "stock": int(stock[i]),
+            "taux_journalier": round(float(taux[i]), 3),
+            "moyenne_mobile": round(float(moyenne[i]), 3),
+            "jours_de_stock": None if np.isinf(jours_stock[i]) else round(float(jours_stock[i]), 1),
+            "quantite_perimee_avant_consommation": int(round(a_risque[i])),
+        }
+        for i, pid in enumerate(produits)
+    ]
+    # Les plus urgents d'abord
+    resultat.sort(key=lambda p: (p["jours_de_stock"] is None, p["jours_de_stock"] or 0))
+    return resultat
@@ -0,0 +1,202 @@
+"""
+Cache mémoire des données de référence (produits et emplacements)
+
+Les produits et l'arbre des emplacements changent rarement : les lignes sont
+gardées en mémoire (LRU borné, DDB_CACHE_TAILLE entrées par type), indexées
+par id, EAN et code_emplacement.
+
+Invalidation :
+- dans le processus : après chaque commit modifiant un produit/emplacement
+- entre workers : un compteur (table versions_reference) est incrémenté dans
+  la même transaction ; chaque session le relit une fois et vide le cache s'il
+  a changé.
+Les absences ne sont pas mises en cache : une création n'invalide rien.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event, select, update
+
+from app.database import SessionLocal
+from app.models import Produit as ProduitModel, Emplacement as EmplacementModel, VersionReference, CLE_VERSION
+from app.schemas import Produit, Emplacement
+
+# Configuration par type : schéma figé stocké, champ indexé en plus de l'id
+TYPES = {
+    ProduitModel: ("produits", Produit, "ean"),
+    EmplacementModel: ("emplacements", Emplacement, "code_emplacement"),
+}
+CHAMP_INDEX = {nom: champ for nom, _, champ in TYPES.values()}
+
+class CacheReference:
+    """Cache LRU des produits et emplacements, indexé par id et par code"""
+
+    def __init__(self, taille_max=2048):
+        self.taille_max = taille_max
+        self._verrou = threading.Lock()
+        self._lignes = {nom: OrderedDict() for nom in CHAMP_INDEX}
+        self._index = {nom: {} for nom in CHAMP_INDEX}
+        self._version = None
+        # Incrémentée à chaque invalidation : une lecture en base commencée
+        # avant ne doit pas remettre en cache une ligne périmée
+        self._generation = 0
+        self.succes = 0
+        self.echecs = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # === Lectures ===
+    def produit_par_id(self, db, produit_id):
+        return self._lire(db, ProduitModel, "id", produit_id)
+
+    def produit_par_ean(self, db, ean):
+        return self._lire(db, ProduitModel, "ean", ean)
+
+    def emplacement_par_id(self, db, emplacement_id):
+        return self._lire(db, EmplacementModel, "id", emplacement_id)
+
+    def emplacement_par_code(self, db, code_emplacement):
+        return self._lire(db, EmplacementModel, "code_emplacement", code_emplacement.upper())
+
+    def _lire(self, db, modele, champ, valeur):
+        nom, schema, _ = TYPES[modele]
+        self._verifier_version(db)
+
+        with self._verrou:
+            ligne_id = valeur if champ == "id" else self._index[nom].get(valeur)
+            ligne = self._lignes[nom].get(ligne_id)
+            if ligne is not None:
+                self._lignes[nom].move_to_end(ligne_id)
+                self.succes += 1
+                return ligne
+            self.echecs += 1
+            generation = self._generation
+
+        objet = db.query(modele).filter(getattr(modele, champ) == valeur).first()
+        if objet is None:
+            return None
+
+        ligne = schema.model_validate(objet)
+        self._stocker(nom, ligne, generation)
+        return ligne
+
+    def _stocker(self, nom, ligne, generation):
+        champ_index = CHAMP_INDEX[nom]
+        with self._verrou:
+            if generation != self._generation:
+                return
+            lignes = self._lignes[nom]
+            lignes[ligne.id] = ligne
+            lignes.move_to_end(ligne.id)
+            cle = getattr(ligne, champ_index)
+            if cle is not None:
+                self._index[nom][cle] = ligne.id
+
+            while len(lignes) > self.taille_max:
+                _, evincee = lignes.popitem(last=False)
+                self._index[nom].pop(getattr(evincee, champ_index), None)
+                self.evictions += 1
+
+    # === Invalidation ===
+    def _verifier_version(self, db):
+        """Relire le compteur (une fois par session) et vider le cache s'il a changé"""
+        version = db.info.get("version_reference")
+        if version is None:
+            version = db.execute(
+                select(VersionReference.version).where(VersionReference.nom == CLE_VERSION)
+            ).scalar() or 0
+            db.info["version_reference"] = version
+
+        with self._verrou:
+            if version != self._version:
+                if self._version is not None:
+                    self.invalidations += 1
+                self._vider()
+                self._version = version
+
+    def invalider(self, cles, version_avant, version_apres):
+        """Retirer les lignes modifiées après un commit de ce processus"""
+        with self._verrou:
+            self._generation += 1
+            for nom, ligne_id in cles:
+                ligne = self._lignes[nom].pop(ligne_id, None)
+                if ligne is not None:
+                    self._index[nom].pop(getattr(ligne, CHAMP_INDEX[nom]), None)
+                    self.invalidations += 1
+
+            # Seul notre commit a modifié le compteur : le reste du cache est à jour
+            if self._version == version_avant:
+                self._version = version_apres
+
+    def vider(self):
+        with self._verrou:
+            self._vider()
+
+    def _vider(self):
+        self._generation += 1
+        for nom in self._lignes:
+            self._lignes[nom].clear()
+            self._index[nom].clear()
+
+    def stats(self):
+        with self._verrou:
+            total = self.succes + self.echecs
+            return {
+                "produits": len(self._lignes["produits"]),
+                "emplacements": len(self._lignes["emplacements"]),
+                "taille_max": self.taille_max,
+                "succes": self.succes,
+                "echecs": self.echecs,
+                "taux_succes": round(self.succes / total, 3) if total else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "version": self._version,
+            }
+
+cache_reference = CacheReference(int(os.getenv("DDB_CACHE_TAILLE", "2048")))
+
+def signaler_modification(session, modele, ids):
+    """
+    Déclarer des produits/emplacements modifiés hors unit of work
+    (query.delete(), update() en masse...) : incrémente le compteur
+    dans la transaction courante, le cache est invalidé au commit.
+    """
+    nom = TYPES[modele][0]
+    cles = session.info.setdefault("reference_modifiee", set())
+    cles.update((nom, ligne_id) for ligne_id in ids)
+
+    # Ligne créée par initialiser_schema() : un UPDATE seul, sans course à l'INSERT
+    conn = session.connection()
+    table = VersionReference.__table__
+    conn.execute(
+        update(table).where(table.c.nom == CLE_VERSION).values(version=table.c.version + 1)
+    )
+    version = conn.execute(select(table.c.version).where(table.c.nom == CLE_VERSION)).scalar()
+    session.info.setdefault("version_avant", version - 1)
+    session.info["version_apres"] = version
+
+@event.listens_for(SessionLocal, "after_flush")
+def _apres_flush(session, flush_context):
+    # Les créations n'invalident rien (les absences ne sont pas cachées)
+    for modele in TYPES:
+        ids = [
+            objet.id for objet in list(session.dirty) + list(session.deleted)
+            if isinstance(objet, modele) and objet.id is not None
+        ]
+        if ids:
+            signaler_modification(session, modele, ids)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apres_commit(session):
+    session.info.pop("version_reference", None)
+    cles = session.info.pop("reference_modifiee", None)
+    version_avant = session.info.pop("version_avant", None)
+    version_apres = session.info.pop("version_apres", None)
+    if cles:
+        cache_reference.invalider(cles, version_avant, version_apres)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _apres_rollback(session):
+    for cle in ("version_reference", "reference_modifiee", "version_avant", "version_apres"):
+        session.info.pop(cle, None)
@@ -0,0 +1,171 @@
+"""
+Écriture groupée (group commit) des petites mutations
+
+Mode optionnel (DDB_ECRITURE_GROUPEE=1) : au lieu d'un commit (et donc d'un
+fsync) par requête, les opérations d'écriture des requêtes concurrentes sont
+mises en file et validées ensemble dans une seule transaction, toutes les
+DDB_GROUPE_DELAI_MS millisecondes ou dès DDB_GROUPE_TAILLE_MAX opérations.
+
+Chaque opération s'exécute dans son propre SAVEPOINT : si elle échoue, seule
+elle est annulée et son appelant reçoit l'exception ; les autres sont validées.
+Chaque appelant est débloqué quand le commit de son groupe est terminé, ou
+au bout de DDB_GROUPE_TIMEOUT_S secondes (HTTP 503).
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as DelaiDepasse
+
+from fastapi import HTTPException
+
+from app.database import SessionLocal
+
+_ARRET = object()
+
+class EcritureGroupee:
+    """File d'opérations d'écriture validées par groupes dans un thread dédié"""
+
+    def __init__(self, session_factory, delai_ms=5, taille_max=64, timeout_s=30):
+        self._session_factory = session_factory
+        self._delai = delai_ms / 1000
+        self._taille_max = taille_max
+        self.timeout = timeout_s
+        self._file = queue.Queue()
+        self._thread = None
+
+    def demarrer(self):
+        self._thread = threading.Thread(target=self._boucle, name="ecriture-groupee", daemon=True)
+        self._thread.start()
+
+    def arreter(self):
+        """Valider les opérations en attente puis arrêter le thread"""
+        self._file.put(_ARRET)
+        self._thread.join()
+
+    def soumettre(self, operation):
+        """Mettre en file une opération operation(session), retourne un Future"""
+        futur = Future()
+        self._file.put((operation, futur))
+        return futur
+
+    def _boucle(self):
+        arret = False
+        while not arret:
+            element = self._file.get()
+            if element is _ARRET:
+                break
+
+            # Accumuler jusqu'au délai ou à la taille maximale
+            lot = [element]
+            echeance = time.monotonic() + self._delai
+            while len(lot) < self._taille_max:
+                reste = echeance - time.monotonic()
+                if reste <= 0:
+                    break
+                try:
+                    element = self._file.get(timeout=reste)
+                except queue.Empty:
+                    break
+                if element is _ARRET:
+                    arret = True
+                    break
+                lot.append(element)
+
+            self._executer_lot(lot)
+
+    def _executer_lot(self, lot):
+        session = self._session_factory()
+        reussies = []
+        try:
+            if session.get_bind().dialect.name == "sqlite":
+                # Le driver sqlite3 n'ouvre pas de transaction avant un
+                # SAVEPOINT : sans BEGIN explicite, chaque RELEASE validerait.
+                # IMMEDIATE prend le verrou d'écriture dès le début du groupe.
+                session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+            for operation, futur in lot:
+                if not futur.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with session.begin_nested():
+                        resultat = operation(session)
+                except Exception as e:
+                    # Seule cette opération est annulée (ROLLBACK TO SAVEPOINT)
+                    futur.set_exception(e)
+                else:
+                    reussies.append((futur, resultat))
+
+            session.commit()
+        except Exception as e:
+            # Échec du groupe (connexion, verrou, commit) : aucun appelant
+            # ne doit rester bloqué, y compris ceux dont l'opération n'a pas tourné
+            try:
+                session.rollback()
+            except Exception:
+                pass
+            for _, futur in lot:
+                if not futur.done():
+                    futur.set_exception(e)
+        else:
+            for futur, resultat in reussies:
+                futur.set_result(resultat)
+        finally:
+            session.close()
+
+# Instance active (None : chaque requête valide sa propre transaction)
+_ecriture_groupee = None
+
+def demarrer():
+    """Activer l'écriture groupée si DDB_ECRITURE_GROUPEE est défini"""
+    global _ecriture_groupee
+    if os.getenv("DDB_ECRITURE_GROUPEE", "0") not in ("1", "true", "oui"):
+        return
+    _ecriture_groupee = EcritureGroupee(
+        SessionLocal,
+        delai_ms=float(os.getenv("DDB_GROUPE_DELAI_MS", "5")),
+        taille_max=int(os.getenv("DDB_GROUPE_TAILLE_MAX", "64")),
+        timeout_s=float(os.getenv("DDB_GROUPE_TIMEOUT_S", "30"))
+    )
+    _ecriture_groupee.demarrer()
+
+def arreter():
+    global _ecriture_groupee
+    if _ecriture_groupee is not None:
+        _ecriture_groupee.arreter()
+        _ecriture_groupee = None
+
+def executer_ecriture(db, operation):
+    """
+    Exécuter operation(session) et valider
+
+    - Mode groupé : l'opération part dans le prochain groupe (autre session)
+    - Sinon : exécutée et validée directement dans la session de la requête
+    L'opération ne doit donc utiliser que la session reçue en paramètre.
+    """
+    if _ecriture_groupee is not None:
+        # Rendre la connexion de la requête au pool avant d'attendre : sinon
+        # les requêtes en attente épuisent le pool et le thread d'écriture
+        # ne peut plus en obtenir. close() détache les objets déjà chargés
+        # sans les expirer, ils restent lisibles par l'appelant.
+        db.close()
+        groupe = _ecriture_groupee
+        futur = groupe.soumettre(operation)
+        try:
+            return futur.result(timeout=groupe.timeout)
+        except DelaiDepasse:
+            if futur.cancel():
+                raise HTTPException(status_code=503, detail="Écriture en attente trop longue, réessayer")
+        # Déjà en cours dans un groupe : attendre sa fin (ou abandonner)
+        try:
+            return futur.result(timeout=groupe.timeout)
+        except DelaiDepasse:
+            raise HTTPException(status_code=504, detail="Écriture non confirmée dans le délai")
+
+    try:
+        resultat = operation(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return resultat
@@ -0,0 +1,241 @@
+"""
+Enrichissement en tâche de fond des produits incomplets via leur EAN
+
+Parcourt les produits ayant un EAN mais sans marque ou sans description,
+interroge les fournisseurs de recherche_ean.py (OpenFoodFacts puis
+Barcodelookup) et complète les champs manquants par lots.
+
+- Concurrence bornée (--concurrence)
+- Débit limité par fournisseur (seau à jetons, DDB_DEBIT_OPENFOODFACTS et
+  DDB_DEBIT_BARCODELOOKUP en requêtes/seconde) ; un fournisseur dont le
+  prochain jeton est à plus de DDB_ATTENTE_MAX_JETON secondes est sauté
+  plutôt que d'immobiliser le lot (produit compté comme « reporté »)
+- Réessais avec backoff exponentiel sur les erreurs temporaires ; une erreur
+  inattendue (réponse illisible...) passe au fournisseur suivant et le produit
+  est compté en « erreurs » sans bloquer le lot
+- Reprise : le dernier id traité est enregistré à chaque lot (progression_taches)
+  et remis à zéro à la fin d'un passage complet : le passage suivant réessaie
+  les produits reportés ou introuvables
+
+Usage :
+    python -m app.enrichissement [--concurrence 4] [--taille-lot 50] [--depuis-debut]
+Ou au démarrage de l'API : DDB_ENRICHISSEMENT_AUTO=1 (à n'activer que sur un
+seul processus en mode multi-workers).
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+
+import httpx
+from sqlalchemy import or_, select, update
+
+from app.cache import signaler_modification
+from app.database import SessionLocal, initialiser_schema
+from app.models import Produit as ProduitModel, ProgressionTache
+from app.routers.recherche_ean import FOURNISSEURS, ErreurFournisseur
+
+NOM_TACHE = "enrichissement_ean"
+CHAMPS = ("marque", "description")
+
+# Débits par défaut : OpenFoodFacts demande <= 100 requêtes/min,
+# Barcodelookup est limité à 100 requêtes/jour
+DEBITS = {
+    "OpenFoodFacts": float(os.getenv("DDB_DEBIT_OPENFOODFACTS", "1.5")),
+    "Barcodelookup": float(os.getenv("DDB_DEBIT_BARCODELOOKUP", str(100 / 86400))),
+}
+ATTENTE_MAX_JETON = float(os.getenv("DDB_ATTENTE_MAX_JETON", "5"))
+
+class SeauJetons:
+    """Limiteur de débit : debit jetons par seconde, au plus capacite d'avance"""
+
+    def __init__(self, debit, capacite=1):
+        self.debit = debit
+        self.capacite = capacite
+        self._jetons = capacite
+        self._dernier = time.monotonic()
+        self._verrou = asyncio.Lock()
+
+    async def prendre(self, attente_max=None):
+        """Prendre un jeton ; False sans attendre si l'attente dépasserait attente_max"""
+        async with self._verrou:
+            while True:
+                maintenant = time.monotonic()
+                self._jetons = min(self.capacite, self._jetons + (maintenant - self._dernier) * self.debit)
+                self._dernier = maintenant
+                if self._jetons >= 1:
+                    self._jetons -= 1
+                    return True
+                attente = (1 - self._jetons) / self.debit
+                if attente_max is not None and attente > attente_max:
+                    return False
+                await asyncio.sleep(attente)
+
+def fournisseurs_par_defaut():
+    """[(nom, interroger(client, ean), seau)] dans l'ordre d'interrogation"""
+    return [(nom, interroger, SeauJetons(DEBITS[nom])) for nom, interroger in FOURNISSEURS]
+
+async def resoudre_ean(client, fournisseurs, ean, tentatives=3, delai_base=1.0,
+                       attente_max=ATTENTE_MAX_JETON, sautes=None, erreurs=None):
+    """
+    Interroger les fournisseurs dans l'ordre, avec réessais ; None si introuvable.
+    Les fournisseurs sautés faute de jeton sont ajoutés à sautes, ceux en
+    erreur inattendue à erreurs.
+    """
+    for nom, interroger, seau in fournisseurs:
+        resultat = None
+        for tentative in range(tentatives):
+            if not await seau.prendre(attente_max):
+                if sautes is not None:
+                    sautes.add(nom)
+                break
+            try:
+                resultat = await interroger(client, ean)
+                break
+            except (ErreurFournisseur, httpx.HTTPError) as e:
+                print(f"Erreur {nom} ({ean}), tentative {tentative + 1}/{tentatives}: {e}")
+                resultat = None
+                if tentative < tentatives - 1:
+                    await asyncio.sleep(delai_base * 2 ** tentative * (1 + random.random()))
+            except Exception as e:
+                # Non temporaire (JSON invalide...) : inutile de réessayer ce fournisseur
+                print(f"Erreur inattendue {nom} ({ean}): {e!r}")
+                if erreurs is not None:
+                    erreurs.add(nom)
+                break
+        if resultat:
+            return resultat
+    return None
+
+# === Accès base (synchrone, exécuté hors de la boucle asyncio) ===
+
+def lire_curseur(session_factory):
+    with session_factory() as session:
+        progression = session.get(ProgressionTache, NOM_TACHE)
+        return progression.curseur if progression else 0
+
+def lot_suivant(session_factory, curseur, taille_lot):
+    """Produits incomplets avec EAN, après le curseur, par id croissant"""
+    with session_factory() as session:
+        lignes = session.execute(
+            select(ProduitModel.id, ProduitModel.ean, ProduitModel.marque, ProduitModel.description)
+            .where(
+                ProduitModel.id > curseur,
+                ProduitModel.ean.isnot(None),
+                or_(ProduitModel.marque.is_(None), ProduitModel.description.is_(None))
+            )
+            .order_by(ProduitModel.id)
+            .limit(taille_lot)
+        ).all()
+        return [ligne._asdict() for ligne in lignes]
+
+def ecrire_lot(session_factory, mises_a_jour, curseur):
+    """Mettre à jour les produits (UPDATE groupé) et le curseur dans une transaction"""
+    with session_factory() as session:
+        if mises_a_jour:
+            session.execute(update(ProduitModel), mises_a_jour)
+            signaler_modification(session, ProduitModel, [m["id"] for m in mises_a_jour])
+
+        progression = session.get(ProgressionTache, NOM_TACHE)
+        if progression is None:
+            session.add(ProgressionTache(nom=NOM_TACHE, curseur=curseur))
+        else:
+            progression.curseur = curseur
+        session.commit()
+
+def champs_manquants(produit, resultat):
+    """Ne compléter que les champs vides, sans écraser la saisie manuelle"""
+    valeurs = {
+        champ: resultat[champ] for champ in CHAMPS
+        if not produit[champ] and resultat.get(champ)
+    }
+    if not valeurs:
+        return None
+    return {"id": produit["id"], "updated_at": datetime.utcnow(), **valeurs}
+
+async def enrichir(session_factory=SessionLocal, fournisseurs=None, concurrence=4,
+                   taille_lot=50, tentatives=3, depuis_debut=False, client=None,
+                   delai_base=1.0, attente_max=ATTENTE_MAX_JETON):
+    """Traiter tous les produits incomplets restants, retourne les compteurs"""
+    fournisseurs = fournisseurs or fournisseurs_par_defaut()
+    curseur = 0 if depuis_debut else await asyncio.to_thread(lire_curseur, session_factory)
+    semaphore = asyncio.Semaphore(concurrence)
+    stats = {"traites": 0, "enrichis": 0, "introuvables": 0, "reportes": 0, "erreurs": 0}
+
+    async def traiter(client, produit):
+        sautes, erreurs = set(), set()
+        async with semaphore:
+            try:
+                resultat = await resoudre_ean(
+                    client, fournisseurs, produit["ean"], tentatives, delai_base, attente_max, sautes, erreurs
+                )
+            except Exception as e:
+                # Un produit en échec ne doit pas empêcher d'écrire le lot et le curseur
+                print(f"❌ Erreur enrichissement produit {produit['id']} : {e!r}")
+                resultat = None
+                erreurs.add("enrichissement")
+        return produit, resultat, sautes, erreurs
+
+    async with (client or httpx.AsyncClient()) as client:
+        while True:
+            lot = await asyncio.to_thread(lot_suivant, session_factory, curseur, taille_lot)
+            if not lot:
+                # Passage complet : le prochain repart du début (reportés, introuvables)
+                await asyncio.to_thread(ecrire_lot, session_factory, [], 0)
+                break
+
+            resultats = await asyncio.gather(*(traiter(client, produit) for produit in lot))
+
+            mises_a_jour = []
+            for produit, resultat, sautes, erreurs in resultats:
+                stats["traites"] += 1
+                valeurs = champs_manquants(produit, resultat) if resultat else None
+                if valeurs:
+                    mises_a_jour.append(valeurs)
+                    stats["enrichis"] += 1
+                elif sautes:
+                    # Quota épuisé : réessayé au passage suivant
+                    stats["reportes"] += 1
+                elif erreurs:
+                    stats["erreurs"] += 1
+                else:
+                    stats["introuvables"] += 1
+
+            curseur = lot[-1]["id"]
+            await asyncio.to_thread(ecrire_lot, session_factory, mises_a_jour, curseur)
+            print(f"🔎 Enrichissement : {stats['traites']} traités, {stats['enrichis']} enrichis (id <= {curseur})")
+
+    return stats
+
+async def boucle_enrichissement(intervalle):
+    """Tâche de fond lancée par l'API : un passage toutes les intervalle secondes"""
+    while True:
+        try:
+            await enrichir()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Erreur enrichissement : {e}")
+        await asyncio.sleep(intervalle)
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrichir les produits incomplets via leur EAN")
+    parser.add_argument("--concurrence", type=int, default=4)
+    parser.add_argument("--taille-lot", type=int, default=50)
+    parser.add_argument("--tentatives", type=int, default=3)
+    parser.add_argument("--depuis-debut", action="store_true", help="Ignorer la progression enregistrée")
+    args = parser.parse_args()
+
+    initialiser_schema()
+    stats = asyncio.run(enrichir(
+        concurrence=args.concurrence,
+        taille_lot=args.taille_lot,
+        tentatives=args.tentatives,
+        depuis_debut=args.depuis_debut
+    ))
+    print(f"✅ Terminé : {stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Requêtes sur l'arbre des emplacements"""
+from sqlalchemy import Text, cast, literal_column, select
+
+from app.models import Emplacement
+
+def sous_arbre(emplacement_id):
+    """CTE récursive : l'emplacement et tous ses descendants (colonne id)"""
+    racine = select(Emplacement.id).where(Emplacement.id == emplacement_id).cte(
+        "sous_arbre", recursive=True
+    )
+    enfants = select(Emplacement.id).join(racine, Emplacement.parent_id == racine.c.id)
+    return racine.union_all(enfants)
+
+def chemins_emplacements():
+    """CTE récursive : id de chaque emplacement et son chemin complet (Cuisine > Placard > Boîte)"""
+    racines = select(
+        Emplacement.id, cast(Emplacement.nom, Text).label("chemin")
+    ).where(Emplacement.parent_id.is_(None)).cte("chemins", recursive=True)
+    enfants = select(
+        Emplacement.id, racines.c.chemin + " > " + cast(Emplacement.nom, Text)
+    ).join(racines, Emplacement.parent_id == racines.c.id)
+    return racines.union_all(enfants)
+
+def profondeurs_emplacements():
+    """CTE récursive : id de chaque emplacement et sa profondeur réelle (0 pour une racine)"""
+    racines = select(
+        Emplacement.id, literal_column("0").label("profondeur")
+    ).where(Emplacement.parent_id.is_(None)).cte("profondeurs", recursive=True)
+    enfants = select(
+        Emplacement.id, racines.c.profondeur + 1
+    ).join(racines, Emplacement.parent_id == racines.c.id)
+    return racines.union_all(enfants)
@@ -1,17 +1,36 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
-from app.routers import produits, emplacements, articles, recherche_ean
+from app import ecriture_groupee, enrichissement
+from app.cache import cache_reference
+from app.routers import produits, emplacements, articles, recherche_ean, export, statistiques
 
-# Créer les tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Écriture groupée (optionnelle, DDB_ECRITURE_GROUPEE=1)
+    ecriture_groupee.demarrer()
+    
+    # Enrichissement EAN en tâche de fond (optionnel, DDB_ENRICHISSEMENT_AUTO=1)
+    tache_enrichissement = None
+    if os.getenv("DDB_ENRICHISSEMENT_AUTO", "0") in ("1", "true", "oui"):
+        intervalle = int(os.getenv("DDB_ENRICHISSEMENT_INTERVALLE", "3600"))
+        tache_enrichissement = asyncio.create_task(enrichissement.boucle_enrichissement(intervalle))
+    
+    yield
+    
+    if tache_enrichissement:
+        tache_enrichissement.cancel()
+    ecriture_groupee.arreter()
 
 # Créer application FastAPI
 app = FastAPI(
     title="DDB-Stock API",
     description="API de gestion d'inventaire domestique",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Servir les fichiers statiques (images)
@@ -30,6 +49,8 @@ app.include_router(produits.router)
 app.include_router(emplacements.router)
 app.include_router(articles.router)
 app.include_router(recherche_ean.router)
+app.include_router(export.router)
+app.include_router(statistiques.router)
 
 # Servir fichiers statiques (frontend)
 app.mount("/web", StaticFiles(directory="/opt/ddb-stock/web", html=True), name="web")
@@ -46,10 +67,17 @@ def root():
             "produits": "/produits",
             "emplacements": "/emplacements",
             "articles": "/articles",
-            "recherche_ean": "/recherche-ean/{ean}"
+            "recherche_ean": "/recherche-ean/{ean}",
+            "export": "/export/articles?format=csv|xlsx",
+            "statistiques": "/statistiques/consommation"
         }
     }
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "version": "2.0.0"}
\ No newline at end of file
+    return {"status": "ok", "version": "2.0.0"}
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Statistiques du cache produits/emplacements de ce worker"""
+    return cache_reference.stats()
\ No newline at end of file
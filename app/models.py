@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, event
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, event
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
@@ -22,7 +22,7 @@ class Emplacement(Base):
     id = Column(Integer, primary_key=True, index=True)
     code_emplacement = Column(String, unique=True, nullable=False, index=True)
     nom = Column(String, nullable=False)
-    parent_id = Column(Integer, ForeignKey("emplacements.id"), nullable=True)
+    parent_id = Column(Integer, ForeignKey("emplacements.id"), nullable=True, index=True)
     niveau = Column(Integer, default=1)
     description = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -44,15 +44,21 @@ class Article(Base):
     id = Column(Integer, primary_key=True, index=True)
     code_article = Column(String, unique=True, nullable=False, index=True)
     produit_id = Column(Integer, ForeignKey("produits.id"), nullable=False)
-    emplacement_id = Column(Integer, ForeignKey("emplacements.id"), nullable=False)
+    emplacement_id = Column(Integer, ForeignKey("emplacements.id"), nullable=False, index=True)
     quantite = Column(Integer, default=1)
-    date_peremption = Column(DateTime, nullable=True)
+    date_peremption = Column(DateTime, nullable=True, index=True)
     commentaire = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, onupdate=datetime.utcnow, nullable=True)
     
     produit = relationship("Produit", back_populates="articles")
     emplacement = relationship("Emplacement", back_populates="articles")
+    
+    __table_args__ = (
+        # FEFO : articles d'un produit triés par péremption puis ancienneté
+        # (sert aussi d'index sur produit_id seul : colonne de tête)
+        Index("ix_articles_produit_peremption", "produit_id", "date_peremption", "created_at"),
+    )
 
 # Event listener pour convertir code_article en majuscules
 @event.listens_for(Article, 'before_insert')
@@ -60,3 +66,32 @@ class Article(Base):
 def uppercase_code_article(mapper, connection, target):
     if target.code_article:
         target.code_article = target.code_article.upper()
+
+# Compteur de modifications des produits/emplacements :
+# permet à chaque worker de savoir si son cache (app/cache.py) est périmé.
+# La ligne CLE_VERSION est créée par initialiser_schema()
+CLE_VERSION = "reference"
+
+class VersionReference(Base):
+    __tablename__ = "versions_reference"
+    
+    nom = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+# Avancement des tâches de fond (reprise après interruption)
+class ProgressionTache(Base):
+    __tablename__ = "progression_taches"
+    
+    nom = Column(String, primary_key=True)
+    curseur = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Historique des retraits de stock (une ligne par événement), pour les statistiques
+# Pas de clé étrangère : l'historique survit à la suppression du produit
+class Consommation(Base):
+    __tablename__ = "consommations"
+    
+    id = Column(Integer, primary_key=True)
+    produit_id = Column(Integer, nullable=False)
+    quantite = Column(Integer, nullable=False)
+    horodatage = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
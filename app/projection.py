@@ -0,0 +1,109 @@
+"""
+Projections légères pour les endpoints de liste et de détail
+
+    ?fields=code_article,quantite,produit.nom   colonnes voulues
+    ?expand=produit                             relations jointes (toutes colonnes)
+    ?format=compact                             {"colonnes": [...], "lignes": [[...]]}
+
+La requête ne sélectionne que les colonnes demandées (SELECT explicite, jointure
+externe pour les relations) : rien d'autre n'est chargé, validé ni sérialisé.
+"""
+from datetime import date, datetime
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+
+def _decouper(valeur):
+    return [v.strip() for v in valeur.split(",") if v.strip()] if valeur else []
+
+def _valeur_json(valeur):
+    if isinstance(valeur, (datetime, date)):
+        return valeur.isoformat()
+    return valeur
+
+class Projection:
+    """Colonnes et jointures demandées pour un modèle"""
+
+    def __init__(self, modele, fields=None, expand=None, relations=None):
+        """
+        relations : {"nom": (entité jointe, modèle de base, condition de jointure)}
+        """
+        self.modele = modele
+        self.relations = relations or {}
+        self.colonnes = []
+        self.jointures = []
+
+        a_etendre = _decouper(expand)
+        for relation in a_etendre:
+            self._verifier_relation(relation)
+
+        champs = _decouper(fields) or list(modele.__table__.columns.keys())
+        # Relation étendue sans champ précis : toutes ses colonnes
+        for relation in a_etendre:
+            if not any(champ.startswith(relation + ".") for champ in champs):
+                base = self.relations[relation][1]
+                champs += [f"{relation}.{nom}" for nom in base.__table__.columns.keys()]
+
+        for champ in champs:
+            self._ajouter(champ)
+
+    def _verifier_relation(self, relation):
+        if relation not in self.relations:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Relation inconnue : {relation} (possibles : {', '.join(self.relations) or 'aucune'})"
+            )
+
+    def _ajouter(self, champ):
+        if "." in champ:
+            relation, nom = champ.split(".", 1)
+            self._verifier_relation(relation)
+            entite, base, _ = self.relations[relation]
+            if relation not in self.jointures:
+                self.jointures.append(relation)
+        else:
+            entite = base = self.modele
+            nom = champ
+
+        if nom not in base.__table__.columns:
+            raise HTTPException(status_code=400, detail=f"Champ inconnu : {champ}")
+        self.colonnes.append((champ, getattr(entite, nom)))
+
+    @property
+    def noms(self):
+        return [nom for nom, _ in self.colonnes]
+
+    def requete(self):
+        """SELECT des seules colonnes demandées, à compléter par l'appelant (where, limit...)"""
+        requete = select(*[colonne for _, colonne in self.colonnes]).select_from(self.modele)
+        for relation in self.jointures:
+            entite, _, condition = self.relations[relation]
+            requete = requete.outerjoin(entite, condition)
+        return requete
+
+    def _objet(self, ligne):
+        objet = {}
+        for nom, valeur in zip(self.noms, ligne):
+            if "." in nom:
+                relation, champ = nom.split(".", 1)
+                objet.setdefault(relation, {})[champ] = _valeur_json(valeur)
+            else:
+                objet[nom] = _valeur_json(valeur)
+        return objet
+
+    def liste(self, db, requete, format_=None):
+        """Exécuter et répondre en objets (défaut) ou en tableau de tableaux (compact)"""
+        lignes = db.execute(requete).all()
+        if format_ == "compact":
+            return JSONResponse({
+                "colonnes": self.noms,
+                "lignes": [[_valeur_json(v) for v in ligne] for ligne in lignes]
+            })
+        return JSONResponse([self._objet(ligne) for ligne in lignes])
+
+    def detail(self, db, requete, message_404):
+        ligne = db.execute(requete.limit(1)).first()
+        if ligne is None:
+            raise HTTPException(status_code=404, detail=message_404)
+        return JSONResponse(self._objet(ligne))
@@ -1 +1 @@
-from . import produits, emplacements, articles, recherche_ean
+from . import produits, emplacements, articles, recherche_ean, export, statistiques
@@ -1,13 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime, timedelta
 from app.database import get_db
-from app.models import Article, Produit, Emplacement
-from app.schemas import ArticleCreate, ArticleResponse, ArticleDetail
+from app.cache import cache_reference
+from app.ecriture_groupee import executer_ecriture
+from app.models import Article, Produit, Emplacement, Consommation
+from app.hierarchie import sous_arbre
+from app.projection import Projection
+from app.schemas import (
+    ArticleCreate, ArticleResponse, ArticleDetail, ConsommationFefo, PlanFefo, ListeCompacte, ObjetPartiel
+)
 
 router = APIRouter(prefix="/articles", tags=["Articles"])
 
+# Relations disponibles pour expand= / fields=relation.champ
+RELATIONS = {
+    "produit": (Produit, Produit, Article.produit_id == Produit.id),
+    "emplacement": (Emplacement, Emplacement, Article.emplacement_id == Emplacement.id),
+}
+
 @router.post("/", response_model=ArticleResponse)
 def creer_article(article: ArticleCreate, db: Session = Depends(get_db)):
     """Créer un nouvel article"""
@@ -15,13 +29,13 @@ def creer_article(article: ArticleCreate, db: Session = Depends(get_db)):
     # Convertir en majuscules
     article.code_article = article.code_article.upper()
     
-    # Vérifier que le produit existe
-    produit = db.query(Produit).filter(Produit.id == article.produit_id).first()
+    # Vérifier que le produit existe (cache de référence)
+    produit = cache_reference.produit_par_id(db, article.produit_id)
     if not produit:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
     
-    # Vérifier que l'emplacement existe
-    emplacement = db.query(Emplacement).filter(Emplacement.id == article.emplacement_id).first()
+    # Vérifier que l'emplacement existe (cache de référence)
+    emplacement = cache_reference.emplacement_par_id(db, article.emplacement_id)
     if not emplacement:
         raise HTTPException(status_code=404, detail="Emplacement non trouvé")
     
@@ -30,23 +44,45 @@ def creer_article(article: ArticleCreate, db: Session = Depends(get_db)):
     if existe:
         raise HTTPException(status_code=400, detail=f"Code article {article.code_article} déjà utilisé")
     
-    # Créer l'article
-    db_article = Article(**article.model_dump())
-    db.add(db_article)
-    db.commit()
-    db.refresh(db_article)
+    # Créer l'article (id connu dès l'INSERT via RETURNING, pas de refresh)
+    donnees = article.model_dump()
+    
+    def inserer(session):
+        db_article = Article(**donnees)
+        session.add(db_article)
+        # Même code créé entre la vérification et l'INSERT (écriture groupée notamment)
+        try:
+            session.flush()
+        except IntegrityError:
+            raise HTTPException(status_code=400, detail=f"Code article {article.code_article} déjà utilisé")
+        return db_article
     
-    return db_article
+    return executer_ecriture(db, inserer)
 
-@router.get("/", response_model=List[ArticleDetail])
+@router.get("/", response_model=Union[List[ArticleDetail], List[ObjetPartiel], ListeCompacte])
 def lire_articles(
     skip: int = 0,
     limit: int = 100,
     produit_id: Optional[int] = None,
     emplacement_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    format_: Optional[str] = Query(None, alias="format", pattern="^(objets|compact)$"),
     db: Session = Depends(get_db)
 ):
-    """Lister tous les articles avec filtres optionnels"""
+    """
+    Lister tous les articles avec filtres optionnels
+    - fields / expand / format : projection légère (seules les colonnes demandées sont lues)
+    """
+    if fields or expand or format_:
+        projection = Projection(Article, fields, expand, RELATIONS)
+        requete = projection.requete()
+        if produit_id:
+            requete = requete.where(Article.produit_id == produit_id)
+        if emplacement_id:
+            requete = requete.where(Article.emplacement_id == emplacement_id)
+        return projection.liste(db, requete.offset(skip).limit(limit), format_)
+    
     query = db.query(Article)
     
     if produit_id:
@@ -75,9 +111,20 @@ def lire_articles(
     
     return result
 
-@router.get("/{article_id}", response_model=ArticleDetail)
-def lire_article(article_id: int, db: Session = Depends(get_db)):
+@router.get("/{article_id}", response_model=Union[ArticleDetail, ObjetPartiel])
+def lire_article(
+    article_id: int,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     """Lire un article spécifique"""
+    if fields or expand:
+        projection = Projection(Article, fields, expand, RELATIONS)
+        return projection.detail(
+            db, projection.requete().where(Article.id == article_id), "Article non trouvé"
+        )
+    
     article = db.query(Article).filter(Article.id == article_id).first()
     if not article:
         raise HTTPException(status_code=404, detail="Article non trouvé")
@@ -105,11 +152,14 @@ def modifier_article(article_id: int, quantite: int, db: Session = Depends(get_d
     if quantite < 0:
         raise HTTPException(status_code=400, detail="La quantité ne peut pas être négative")
     
-    article.quantite = quantite
-    db.commit()
-    db.refresh(article)
+    def mettre_a_jour(session):
+        db_article = session.get(Article, article_id)
+        if not db_article:
+            raise HTTPException(status_code=404, detail="Article non trouvé")
+        db_article.quantite = quantite
+        return db_article
     
-    return article
+    return executer_ecriture(db, mettre_a_jour)
 
 @router.delete("/{article_id}")
 def supprimer_article(article_id: int, quantite_a_retirer: int = None, db: Session = Depends(get_db)):
@@ -124,11 +174,21 @@ def supprimer_article(article_id: int, quantite_a_retirer: int = None, db: Sessi
     
     code_article = article.code_article
     quantite_actuelle = article.quantite
+    produit_id = article.produit_id
     
     # Si pas de quantité spécifiée ou quantité >= total : suppression complète
     if quantite_a_retirer is None or quantite_a_retirer >= quantite_actuelle:
-        db.delete(article)
-        db.commit()
+        def supprimer(session):
+            # Condition sur la quantité lue : l'historique enregistre ce qui a réellement été retiré
+            supprimes = session.query(Article).filter(
+                Article.id == article_id, Article.quantite == quantite_actuelle
+            ).delete(synchronize_session=False)
+            if supprimes != 1:
+                raise HTTPException(status_code=409, detail="Stock modifié pendant l'opération, réessayer")
+            # Historique de consommation (statistiques)
+            session.add(Consommation(produit_id=produit_id, quantite=quantite_actuelle))
+        
+        executer_ecriture(db, supprimer)
         return {
             "action": "suppression_complete",
             "message": f"Article {code_article} supprimé définitivement",
@@ -140,15 +200,24 @@ def supprimer_article(article_id: int, quantite_a_retirer: int = None, db: Sessi
     if quantite_a_retirer <= 0:
         raise HTTPException(status_code=400, detail="La quantité à retirer doit être positive")
     
-    article.quantite -= quantite_a_retirer
-    db.commit()
-    db.refresh(article)
+    def decrementer(session):
+        # Décrément relatif et conditionnel : correct sous retraits concurrents.
+        # L'article doit garder au moins une unité (le vider passe par la suppression).
+        modifies = session.query(Article).filter(
+            Article.id == article_id, Article.quantite > quantite_a_retirer
+        ).update({"quantite": Article.quantite - quantite_a_retirer}, synchronize_session=False)
+        if modifies != 1:
+            raise HTTPException(status_code=409, detail="Stock modifié pendant l'opération, réessayer")
+        session.add(Consommation(produit_id=produit_id, quantite=quantite_a_retirer))
+        return session.query(Article.quantite).filter(Article.id == article_id).scalar()
+    
+    quantite_restante = executer_ecriture(db, decrementer)
     
     return {
         "action": "decrementation",
         "message": f"{quantite_a_retirer} article(s) retiré(s) du stock",
         "code_article": code_article,
-        "quantite_restante": article.quantite,
+        "quantite_restante": quantite_restante,
         "quantite_retiree": quantite_a_retirer
     }
 
@@ -232,4 +301,128 @@ def chercher_par_code(code_article: str, db: Session = Depends(get_db)):
         "commentaire": article.commentaire,
         "produit": article.produit,
         "emplacement": article.emplacement
-    }
\ No newline at end of file
+    }
+
+# === FEFO : premier périmé, premier sorti ===
+
+def _resoudre_produit(db, ean, produit_id):
+    """Trouver le produit par EAN ou par id (cache de référence)"""
+    if ean:
+        produit = cache_reference.produit_par_ean(db, ean)
+    elif produit_id:
+        produit = cache_reference.produit_par_id(db, produit_id)
+    else:
+        raise HTTPException(status_code=400, detail="ean ou produit_id requis")
+    
+    if not produit:
+        raise HTTPException(status_code=404, detail="Produit non trouvé")
+    return produit
+
+def _articles_fefo(session, produit_id, emplacement_id=None):
+    """
+    Articles en stock d'un produit dans l'ordre de consommation :
+    péremption la plus proche, puis le plus ancien ; sans date en dernier.
+    Deux lectures par plage de l'index (produit_id, date_peremption, created_at).
+    """
+    colonnes = select(
+        Article.id, Article.code_article, Article.emplacement_id, Article.quantite,
+        Article.date_peremption, Article.created_at
+    ).where(Article.produit_id == produit_id, Article.quantite > 0)
+    
+    if emplacement_id:
+        colonnes = colonnes.where(Article.emplacement_id.in_(select(sous_arbre(emplacement_id).c.id)))
+    
+    avec_date = colonnes.where(Article.date_peremption.isnot(None)).order_by(
+        Article.date_peremption, Article.created_at
+    )
+    sans_date = colonnes.where(Article.date_peremption.is_(None)).order_by(Article.created_at)
+    
+    yield from session.execute(avec_date)
+    yield from session.execute(sans_date)
+
+def _plan_fefo(session, produit_id, emplacement_id=None, quantite=None, limite=None):
+    """Répartir quantite unités sur les articles (ou lister les limite premiers)"""
+    lignes = []
+    reste = quantite
+    for article in _articles_fefo(session, produit_id, emplacement_id):
+        ligne = {
+            "article_id": article.id,
+            "code_article": article.code_article,
+            "emplacement_id": article.emplacement_id,
+            "quantite": article.quantite,
+            "date_peremption": article.date_peremption,
+            "created_at": article.created_at
+        }
+        if quantite is not None:
+            ligne["quantite_a_retirer"] = min(article.quantite, reste)
+            reste -= ligne["quantite_a_retirer"]
+        lignes.append(ligne)
+        
+        if (quantite is not None and reste == 0) or (limite and len(lignes) >= limite):
+            break
+    
+    couverte = sum(l.get("quantite_a_retirer") or 0 for l in lignes)
+    return {
+        "produit_id": produit_id,
+        "quantite_demandee": quantite,
+        "quantite_couverte": couverte,
+        "complet": quantite is None or couverte == quantite,
+        "articles": lignes
+    }
+
+@router.get("/fefo/recommandation", response_model=PlanFefo)
+def recommandation_fefo(
+    ean: Optional[str] = None,
+    produit_id: Optional[int] = None,
+    emplacement_id: Optional[int] = None,
+    quantite: Optional[int] = Query(None, ge=1),
+    limite: int = 10,
+    db: Session = Depends(get_db)
+):
+    """
+    Article(s) à consommer en premier pour un produit (EAN ou id)
+    - emplacement_id : limiter à cet emplacement et ses sous-emplacements
+    - quantite : plan de retrait de N unités réparties sur les articles
+    """
+    produit = _resoudre_produit(db, ean, produit_id)
+    return _plan_fefo(db, produit.id, emplacement_id, quantite, None if quantite else limite)
+
+@router.post("/fefo/appliquer", response_model=PlanFefo)
+def appliquer_fefo(consommation: ConsommationFefo, db: Session = Depends(get_db)):
+    """
+    Retirer N unités d'un produit en suivant l'ordre FEFO, en une transaction
+    (les articles vidés sont supprimés et leur code libéré)
+    """
+    produit = _resoudre_produit(db, consommation.ean, consommation.produit_id)
+    
+    def appliquer(session):
+        plan = _plan_fefo(session, produit.id, consommation.emplacement_id, consommation.quantite)
+        if not plan["complet"]:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Stock insuffisant : {plan['quantite_couverte']} disponible(s) "
+                       f"pour {consommation.quantite} demandé(s)"
+            )
+        
+        for ligne in plan["articles"]:
+            # Conditions sur la quantité lue : échoue si l'article a changé entre-temps
+            if ligne["quantite_a_retirer"] == ligne["quantite"]:
+                requete = session.query(Article).filter(
+                    Article.id == ligne["article_id"], Article.quantite == ligne["quantite"]
+                )
+                modifies = requete.delete(synchronize_session=False)
+            else:
+                requete = session.query(Article).filter(
+                    Article.id == ligne["article_id"], Article.quantite >= ligne["quantite_a_retirer"]
+                )
+                modifies = requete.update(
+                    {"quantite": Article.quantite - ligne["quantite_a_retirer"]},
+                    synchronize_session=False
+                )
+            if modifies != 1:
+                raise HTTPException(status_code=409, detail="Stock modifié pendant l'opération, réessayer")
+        
+        session.add(Consommation(produit_id=produit.id, quantite=consommation.quantite))
+        return plan
+    
+    return executer_ecriture(db, appliquer)
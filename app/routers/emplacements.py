@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from typing import List, Optional, Union
 from app.database import get_db
-from app.models import Emplacement as EmplacementModel
-from app.schemas import EmplacementCreate, EmplacementUpdate, Emplacement
+from app.cache import cache_reference, signaler_modification
+from app.ecriture_groupee import executer_ecriture
+from app.models import Emplacement as EmplacementModel, Article
+from app.projection import Projection
+from app.schemas import EmplacementCreate, EmplacementUpdate, Emplacement, ListeCompacte, ObjetPartiel
 
 router = APIRouter(prefix="/emplacements", tags=["Emplacements"])
 
+# Relations disponibles pour expand= / fields=relation.champ
+Parent = aliased(EmplacementModel)
+RELATIONS = {
+    "parent": (Parent, EmplacementModel, EmplacementModel.parent_id == Parent.id),
+}
+
 @router.post("/", response_model=Emplacement)
 def creer_emplacement(emplacement: EmplacementCreate, db: Session = Depends(get_db)):
     """Créer un nouvel emplacement"""
@@ -14,10 +24,8 @@ def creer_emplacement(emplacement: EmplacementCreate, db: Session = Depends(get_
     # Convertir en majuscules
     emplacement.code_emplacement = emplacement.code_emplacement.upper()
     
-    # Vérifier unicité du code
-    existe = db.query(EmplacementModel).filter(
-        EmplacementModel.code_emplacement == emplacement.code_emplacement
-    ).first()
+    # Vérifier unicité du code (cache de référence)
+    existe = cache_reference.emplacement_par_code(db, emplacement.code_emplacement)
     
     if existe:
         raise HTTPException(
@@ -27,54 +35,83 @@ def creer_emplacement(emplacement: EmplacementCreate, db: Session = Depends(get_
     
     # Si parent_id spécifié, vérifier qu'il existe
     if emplacement.parent_id:
-        parent = db.query(EmplacementModel).filter(
-            EmplacementModel.id == emplacement.parent_id
-        ).first()
+        parent = cache_reference.emplacement_par_id(db, emplacement.parent_id)
         if not parent:
             raise HTTPException(status_code=404, detail="Emplacement parent non trouvé")
         
         # Calculer le niveau automatiquement
         emplacement.niveau = parent.niveau + 1
     
-    # Créer l'emplacement
-    db_emplacement = EmplacementModel(**emplacement.model_dump())
-    db.add(db_emplacement)
-    db.commit()
-    db.refresh(db_emplacement)
-    
-    return db_emplacement
+    # Créer l'emplacement (id connu dès l'INSERT via RETURNING, pas de refresh)
+    donnees = emplacement.model_dump()
+    
+    def inserer(session):
+        db_emplacement = EmplacementModel(**donnees)
+        session.add(db_emplacement)
+        # Même code créé entre la vérification et l'INSERT (écriture groupée notamment)
+        try:
+            session.flush()
+        except IntegrityError:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Code emplacement {emplacement.code_emplacement} déjà utilisé"
+            )
+        return db_emplacement
+    
+    return executer_ecriture(db, inserer)
 
-@router.get("/", response_model=List[Emplacement])
+@router.get("/", response_model=Union[List[Emplacement], List[ObjetPartiel], ListeCompacte])
 def lire_emplacements(
     skip: int = 0,
     limit: int = 100,
     parent_id: Optional[int] = None,
     niveau: Optional[int] = None,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    format_: Optional[str] = Query(None, alias="format", pattern="^(objets|compact)$"),
     db: Session = Depends(get_db)
 ):
-    """Lister tous les emplacements avec filtres optionnels"""
-    query = db.query(EmplacementModel)
-    
+    """
+    Lister tous les emplacements avec filtres optionnels
+    - fields / expand / format : projection légère (seules les colonnes demandées sont lues)
+    """
+    conditions = []
     if parent_id is not None:
         if parent_id == 0:
             # Racines (sans parent)
-            query = query.filter(EmplacementModel.parent_id.is_(None))
+            conditions.append(EmplacementModel.parent_id.is_(None))
         else:
             # Enfants d'un parent spécifique
-            query = query.filter(EmplacementModel.parent_id == parent_id)
+            conditions.append(EmplacementModel.parent_id == parent_id)
     
     if niveau is not None:
-        query = query.filter(EmplacementModel.niveau == niveau)
+        conditions.append(EmplacementModel.niveau == niveau)
+    
+    if fields or expand or format_:
+        projection = Projection(EmplacementModel, fields, expand, RELATIONS)
+        requete = projection.requete().where(*conditions)
+        return projection.liste(db, requete.offset(skip).limit(limit), format_)
     
-    emplacements = query.offset(skip).limit(limit).all()
+    emplacements = db.query(EmplacementModel).filter(*conditions).offset(skip).limit(limit).all()
     return emplacements
 
-@router.get("/{emplacement_id}", response_model=Emplacement)
-def lire_emplacement(emplacement_id: int, db: Session = Depends(get_db)):
+@router.get("/{emplacement_id}", response_model=Union[Emplacement, ObjetPartiel])
+def lire_emplacement(
+    emplacement_id: int,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     """Lire un emplacement spécifique"""
-    emplacement = db.query(EmplacementModel).filter(
-        EmplacementModel.id == emplacement_id
-    ).first()
+    if fields or expand:
+        projection = Projection(EmplacementModel, fields, expand, RELATIONS)
+        return projection.detail(
+            db,
+            projection.requete().where(EmplacementModel.id == emplacement_id),
+            "Emplacement non trouvé"
+        )
+    
+    emplacement = cache_reference.emplacement_par_id(db, emplacement_id)
     
     if not emplacement:
         raise HTTPException(status_code=404, detail="Emplacement non trouvé")
@@ -101,22 +138,22 @@ def modifier_emplacement(
     # Si parent_id est modifié, recalculer le niveau
     if "parent_id" in update_data:
         if update_data["parent_id"]:
-            parent = db.query(EmplacementModel).filter(
-                EmplacementModel.id == update_data["parent_id"]
-            ).first()
+            parent = cache_reference.emplacement_par_id(db, update_data["parent_id"])
             if not parent:
                 raise HTTPException(status_code=404, detail="Emplacement parent non trouvé")
             update_data["niveau"] = parent.niveau + 1
         else:
             update_data["niveau"] = 1
     
-    for key, value in update_data.items():
-        setattr(db_emplacement, key, value)
+    def mettre_a_jour(session):
+        emplacement = session.get(EmplacementModel, emplacement_id)
+        if not emplacement:
+            raise HTTPException(status_code=404, detail="Emplacement non trouvé")
+        for key, value in update_data.items():
+            setattr(emplacement, key, value)
+        return emplacement
     
-    db.commit()
-    db.refresh(db_emplacement)
-    
-    return db_emplacement
+    return executer_ecriture(db, mettre_a_jour)
 
 @router.delete("/{emplacement_id}")
 def supprimer_emplacement(emplacement_id: int, db: Session = Depends(get_db)):
@@ -128,11 +165,12 @@ def supprimer_emplacement(emplacement_id: int, db: Session = Depends(get_db)):
     if not emplacement:
         raise HTTPException(status_code=404, detail="Emplacement non trouvé")
     
-    # Vérifier qu'il n'y a pas d'articles
-    if emplacement.articles:
+    # Vérifier qu'il n'y a pas d'articles (comptage par l'index, sans charger les lignes)
+    nb_articles = db.query(Article).filter(Article.emplacement_id == emplacement_id).count()
+    if nb_articles:
         raise HTTPException(
             status_code=400,
-            detail=f"Impossible de supprimer : {len(emplacement.articles)} article(s) associé(s)"
+            detail=f"Impossible de supprimer : {nb_articles} article(s) associé(s)"
         )
     
     # Vérifier qu'il n'y a pas d'emplacements enfants
@@ -146,8 +184,11 @@ def supprimer_emplacement(emplacement_id: int, db: Session = Depends(get_db)):
             detail=f"Impossible de supprimer : {enfants} emplacement(s) enfant(s)"
         )
     
-    db.delete(emplacement)
-    db.commit()
+    def supprimer(session):
+        session.query(EmplacementModel).filter(EmplacementModel.id == emplacement_id).delete()
+        signaler_modification(session, EmplacementModel, [emplacement_id])
+    
+    executer_ecriture(db, supprimer)
     
     return {"message": f"Emplacement {emplacement.code_emplacement} supprimé"}
 
@@ -157,9 +198,7 @@ def chercher_par_code(code_emplacement: str, db: Session = Depends(get_db)):
     # Convertir en majuscules pour la recherche
     code_emplacement = code_emplacement.upper()
     
-    emplacement = db.query(EmplacementModel).filter(
-        EmplacementModel.code_emplacement == code_emplacement
-    ).first()
+    emplacement = cache_reference.emplacement_par_code(db, code_emplacement)
     
     if not emplacement:
         raise HTTPException(
@@ -0,0 +1,132 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime
+import csv
+import io
+import tempfile
+
+from app.database import SessionLocal
+from app.hierarchie import chemins_emplacements, sous_arbre
+from app.models import Article, Produit, Emplacement
+from sqlalchemy import select
+
+try:
+    import openpyxl
+except ImportError:  # Export XLSX optionnel
+    openpyxl = None
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+# Lignes lues par lot (curseur serveur sur PostgreSQL)
+TAILLE_LOT = 1000
+
+ENTETES = [
+    "code_article", "ean", "produit", "marque", "code_emplacement", "chemin_emplacement",
+    "quantite", "date_peremption", "commentaire", "created_at"
+]
+
+def _requete(emplacement_id, produit_id, peremption_avant, peremption_apres):
+    """Articles joints à leur produit et au chemin complet de leur emplacement"""
+    chemins = chemins_emplacements()
+    requete = select(
+        Article.code_article, Produit.ean, Produit.nom, Produit.marque,
+        Emplacement.code_emplacement, chemins.c.chemin,
+        Article.quantite, Article.date_peremption, Article.commentaire, Article.created_at
+    ).join(
+        Produit, Article.produit_id == Produit.id
+    ).join(
+        Emplacement, Article.emplacement_id == Emplacement.id
+    ).outerjoin(
+        chemins, chemins.c.id == Article.emplacement_id
+    )
+
+    if emplacement_id:
+        requete = requete.where(Article.emplacement_id.in_(select(sous_arbre(emplacement_id).c.id)))
+    if produit_id:
+        requete = requete.where(Article.produit_id == produit_id)
+    if peremption_apres:
+        requete = requete.where(Article.date_peremption >= peremption_apres)
+    if peremption_avant:
+        requete = requete.where(Article.date_peremption <= peremption_avant)
+
+    return requete.order_by(Article.id)
+
+def _lots(requete):
+    """
+    Lire la requête par lots de TAILLE_LOT lignes avec une session propre :
+    la session de la requête HTTP est fermée avant la fin du streaming
+    """
+    with SessionLocal() as session:
+        resultat = session.execute(requete.execution_options(yield_per=TAILLE_LOT))
+        yield from resultat.partitions()
+
+def _valeur_csv(valeur):
+    if isinstance(valeur, datetime):
+        return valeur.strftime("%Y-%m-%d %H:%M:%S")
+    return valeur
+
+def _csv(requete):
+    """CSV ';' avec BOM UTF-8 (ouverture directe dans Excel), un morceau par lot"""
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon, delimiter=";")
+
+    tampon.write("\ufeff")
+    ecrivain.writerow(ENTETES)
+    yield tampon.getvalue()
+
+    for lot in _lots(requete):
+        tampon.seek(0)
+        tampon.truncate(0)
+        ecrivain.writerows([_valeur_csv(v) for v in ligne] for ligne in lot)
+        yield tampon.getvalue()
+
+def _xlsx(requete):
+    """
+    XLSX en mode write_only : les lignes sont écrites sur disque au fil de l'eau.
+    Le format zip impose d'écrire le fichier entier avant de l'envoyer ; il est
+    donc produit dans un fichier temporaire puis transmis par blocs.
+    """
+    classeur = openpyxl.Workbook(write_only=True)
+    feuille = classeur.create_sheet("Inventaire")
+    feuille.append(ENTETES)
+    for lot in _lots(requete):
+        for ligne in lot:
+            feuille.append(list(ligne))
+
+    with tempfile.TemporaryFile() as fichier:
+        classeur.save(fichier)
+        fichier.seek(0)
+        while bloc := fichier.read(64 * 1024):
+            yield bloc
+
+@router.get("/articles")
+def exporter_articles(
+    format_: str = Query("csv", alias="format", pattern="^(csv|xlsx)$"),
+    emplacement_id: Optional[int] = None,
+    produit_id: Optional[int] = None,
+    peremption_avant: Optional[datetime] = None,
+    peremption_apres: Optional[datetime] = None
+):
+    """
+    Exporter l'inventaire en CSV ou XLSX (mémoire constante quel que soit le volume)
+    - emplacement_id : cet emplacement et ses sous-emplacements
+    - peremption_apres / peremption_avant : fenêtre de péremption
+    """
+    requete = _requete(emplacement_id, produit_id, peremption_avant, peremption_apres)
+    horodatage = datetime.now().strftime("%Y%m%d_%H%M")
+
+    if format_ == "xlsx":
+        if openpyxl is None:
+            raise HTTPException(status_code=400, detail="Export XLSX indisponible : openpyxl non installé")
+        contenu = _xlsx(requete)
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        contenu = _csv(requete)
+        media_type = "text/csv; charset=utf-8"
+
+    return StreamingResponse(
+        contenu,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="inventaire_{horodatage}.{format_}"'}
+    )
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, func, select, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
+from datetime import datetime
+import base64
+import json
 from app.database import get_db
-from app.models import Produit as ProduitModel
-from app.schemas import ProduitCreate, ProduitUpdate, Produit
+from app.cache import cache_reference, signaler_modification
+from app.ecriture_groupee import executer_ecriture
+from app.models import Produit as ProduitModel, Article
+from app.projection import Projection
+from app.schemas import ProduitCreate, ProduitUpdate, Produit, PageProduitStock, ListeCompacte, ObjetPartiel
 
 router = APIRouter(prefix="/produits", tags=["Produits"])
 
@@ -13,32 +21,141 @@ def creer_produit(produit: ProduitCreate, db: Session = Depends(get_db)):
     
     # Vérifier unicité de l'EAN si fourni
     if produit.ean:
-        existe = db.query(ProduitModel).filter(ProduitModel.ean == produit.ean).first()
+        existe = cache_reference.produit_par_ean(db, produit.ean)
         if existe:
             raise HTTPException(status_code=400, detail=f"EAN {produit.ean} déjà utilisé")
     
-    # Créer le produit
-    db_produit = ProduitModel(**produit.model_dump())
-    db.add(db_produit)
-    db.commit()
-    db.refresh(db_produit)
+    # Créer le produit (id connu dès l'INSERT via RETURNING, pas de refresh)
+    donnees = produit.model_dump()
     
-    return db_produit
+    def inserer(session):
+        db_produit = ProduitModel(**donnees)
+        session.add(db_produit)
+        # Même EAN créé entre la vérification et l'INSERT (écriture groupée notamment)
+        try:
+            session.flush()
+        except IntegrityError:
+            raise HTTPException(status_code=400, detail=f"EAN {produit.ean} déjà utilisé")
+        return db_produit
+    
+    return executer_ecriture(db, inserer)
 
-@router.get("/", response_model=List[Produit])
-def lire_produits(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Lister tous les produits"""
+@router.get("/", response_model=Union[List[Produit], List[ObjetPartiel], ListeCompacte])
+def lire_produits(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    format_: Optional[str] = Query(None, alias="format", pattern="^(objets|compact)$"),
+    db: Session = Depends(get_db)
+):
+    """Lister tous les produits (fields / format : projection légère)"""
+    if fields or format_:
+        projection = Projection(ProduitModel, fields)
+        return projection.liste(db, projection.requete().offset(skip).limit(limit), format_)
+    
     produits = db.query(ProduitModel).offset(skip).limit(limit).all()
     return produits
 
-@router.get("/{produit_id}", response_model=Produit)
-def lire_produit(produit_id: int, db: Session = Depends(get_db)):
+# Sans date de péremption : classé après toutes les dates
+PEREMPTION_ABSENTE = datetime(9999, 12, 31)
+
+def _requete_stock():
+    """Produits et agrégats de leurs articles en un seul GROUP BY (sous-requête)"""
+    return select(
+        ProduitModel.id, ProduitModel.ean, ProduitModel.nom, ProduitModel.marque,
+        ProduitModel.description, ProduitModel.created_at, ProduitModel.updated_at,
+        func.count(Article.id).label("nb_articles"),
+        func.coalesce(func.sum(Article.quantite), 0).label("quantite_totale"),
+        func.count(Article.emplacement_id.distinct()).label("nb_emplacements"),
+        func.min(Article.date_peremption).label("peremption_proche")
+    ).outerjoin(
+        Article, Article.produit_id == ProduitModel.id
+    ).group_by(ProduitModel.id).subquery("stock")
+
+def _cle_tri(stock, tri):
+    if tri == "quantite":
+        return stock.c.quantite_totale
+    if tri == "peremption":
+        return func.coalesce(stock.c.peremption_proche, PEREMPTION_ABSENTE)
+    return stock.c.nom
+
+def _encoder_curseur(ligne, tri):
+    valeur = ligne.nom if tri == "nom" else ligne.quantite_totale
+    if tri == "peremption":
+        valeur = (ligne.peremption_proche or PEREMPTION_ABSENTE).isoformat()
+    brut = json.dumps([valeur, ligne.id]).encode()
+    return base64.urlsafe_b64encode(brut).decode()
+
+def _decoder_curseur(curseur, tri):
+    try:
+        valeur, dernier_id = json.loads(base64.urlsafe_b64decode(curseur.encode()))
+        if tri == "peremption":
+            valeur = datetime.fromisoformat(valeur)
+        return valeur, int(dernier_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+@router.get("/stock", response_model=PageProduitStock)
+def lire_stock_produits(
+    statut: Optional[str] = Query(None, pattern="^(rupture|faible|disponible)$"),
+    seuil: int = Query(2, ge=0),
+    tri: str = Query("nom", pattern="^(nom|quantite|peremption)$"),
+    apres: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Catalogue avec le stock de chaque produit (agrégé côté serveur)
+    - statut : rupture (quantité 0), faible (1 à seuil), disponible (> 0)
+    - tri : nom, quantite ou peremption (la plus proche d'abord, sans date en dernier)
+    - pagination par clé : passer curseur_suivant de la page précédente dans apres
+    """
+    stock = _requete_stock()
+    cle = _cle_tri(stock, tri)
+    requete = select(stock)
+
+    if statut == "rupture":
+        requete = requete.where(stock.c.quantite_totale == 0)
+    elif statut == "faible":
+        requete = requete.where(and_(stock.c.quantite_totale > 0, stock.c.quantite_totale <= seuil))
+    elif statut == "disponible":
+        requete = requete.where(stock.c.quantite_totale > 0)
+
+    if apres:
+        valeur, dernier_id = _decoder_curseur(apres, tri)
+        requete = requete.where(tuple_(cle, stock.c.id) > tuple_(valeur, dernier_id))
+
+    lignes = db.execute(requete.order_by(cle, stock.c.id).limit(limit + 1)).all()
+    suite = len(lignes) > limit
+    lignes = lignes[:limit]
+
+    return {
+        "produits": [ligne._asdict() for ligne in lignes],
+        "curseur_suivant": _encoder_curseur(lignes[-1], tri) if suite else None
+    }
+
+@router.get("/{produit_id}", response_model=Union[Produit, ObjetPartiel])
+def lire_produit(produit_id: int, fields: Optional[str] = None, db: Session = Depends(get_db)):
     """Lire un produit spécifique"""
-    produit = db.query(ProduitModel).filter(ProduitModel.id == produit_id).first()
+    if fields:
+        projection = Projection(ProduitModel, fields)
+        return projection.detail(
+            db, projection.requete().where(ProduitModel.id == produit_id), "Produit non trouvé"
+        )
+    
+    produit = cache_reference.produit_par_id(db, produit_id)
     if not produit:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
     return produit
 
+@router.get("/ean/{ean}", response_model=Produit)
+def chercher_par_ean(ean: str, db: Session = Depends(get_db)):
+    """Chercher un produit par son code EAN"""
+    produit = cache_reference.produit_par_ean(db, ean)
+    if not produit:
+        raise HTTPException(status_code=404, detail=f"Produit EAN {ean} non trouvé")
+    return produit
+
 @router.put("/{produit_id}", response_model=Produit)
 def modifier_produit(produit_id: int, produit_update: ProduitUpdate, db: Session = Depends(get_db)):
     """Modifier un produit"""
@@ -48,18 +165,22 @@ def modifier_produit(produit_id: int, produit_update: ProduitUpdate, db: Session
     
     # Vérifier unicité EAN si modifié
     if produit_update.ean and produit_update.ean != db_produit.ean:
-        existe = db.query(ProduitModel).filter(ProduitModel.ean == produit_update.ean).first()
+        existe = cache_reference.produit_par_ean(db, produit_update.ean)
         if existe:
             raise HTTPException(status_code=400, detail=f"EAN {produit_update.ean} déjà utilisé")
     
     # Mettre à jour
     update_data = produit_update.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_produit, key, value)
     
-    db.commit()
-    db.refresh(db_produit)
-    return db_produit
+    def mettre_a_jour(session):
+        produit = session.get(ProduitModel, produit_id)
+        if not produit:
+            raise HTTPException(status_code=404, detail="Produit non trouvé")
+        for key, value in update_data.items():
+            setattr(produit, key, value)
+        return produit
+    
+    return executer_ecriture(db, mettre_a_jour)
 
 @router.delete("/{produit_id}")
 def supprimer_produit(produit_id: int, db: Session = Depends(get_db)):
@@ -68,13 +189,17 @@ def supprimer_produit(produit_id: int, db: Session = Depends(get_db)):
     if not produit:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
     
-    # Vérifier qu'il n'y a pas d'articles
-    if produit.articles:
+    # Vérifier qu'il n'y a pas d'articles (comptage par l'index, sans charger les lignes)
+    nb_articles = db.query(Article).filter(Article.produit_id == produit_id).count()
+    if nb_articles:
         raise HTTPException(
             status_code=400,
-            detail=f"Impossible de supprimer : {len(produit.articles)} article(s) associé(s)"
+            detail=f"Impossible de supprimer : {nb_articles} article(s) associé(s)"
         )
     
-    db.delete(produit)
-    db.commit()
+    def supprimer(session):
+        session.query(ProduitModel).filter(ProduitModel.id == produit_id).delete()
+        signaler_modification(session, ProduitModel, [produit_id])
+    
+    executer_ecriture(db, supprimer)
     return {"message": f"Produit {produit.nom} supprimé"}
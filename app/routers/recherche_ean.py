@@ -6,56 +6,79 @@ router = APIRouter(prefix="/recherche-ean", tags=["Recherche EAN"])
 
 BARCODELOOKUP_API_KEY = os.getenv("BARCODELOOKUP_API_KEY", "gzk47hty1h9qbw6b4t1nqcqrg75pwu")
 
+# Surchargeables pour pointer vers un faux fournisseur local (scripts/faux_fournisseurs.py)
+OPENFOODFACTS_URL = os.getenv(
+    "DDB_OPENFOODFACTS_URL", "https://world.openfoodfacts.org/api/v0/product/{ean}.json"
+)
+BARCODELOOKUP_URL = os.getenv("DDB_BARCODELOOKUP_URL", "https://api.barcodelookup.com/v3/products")
+
+class ErreurFournisseur(Exception):
+    """Erreur temporaire d'un fournisseur (quota, erreur serveur) : à réessayer"""
+
+def _verifier_statut(response):
+    if response.status_code == 429 or response.status_code >= 500:
+        raise ErreurFournisseur(f"HTTP {response.status_code}")
+
+async def interroger_openfoodfacts(client, ean):
+    """OpenFoodFacts (gratuit, illimité) : infos produit ou None si inconnu"""
+    response = await client.get(OPENFOODFACTS_URL.format(ean=ean), timeout=5.0)
+    _verifier_statut(response)
+
+    if response.status_code == 200:
+        data = response.json()
+        if data.get("status") == 1:
+            product = data.get("product", {})
+
+            return {
+                "source": "OpenFoodFacts",
+                "nom": product.get("product_name") or product.get("product_name_fr") or "Produit sans nom",
+                "marque": product.get("brands"),
+                "description": product.get("generic_name") or product.get("categories")
+            }
+    return None
+
+async def interroger_barcodelookup(client, ean):
+    """Barcodelookup (100 requêtes/jour) : infos produit ou None si inconnu"""
+    response = await client.get(
+        BARCODELOOKUP_URL,
+        params={"barcode": ean, "key": BARCODELOOKUP_API_KEY},
+        timeout=5.0
+    )
+    _verifier_statut(response)
+
+    if response.status_code == 200:
+        data = response.json()
+        products = data.get("products", [])
+
+        if products:
+            product = products[0]
+
+            return {
+                "source": "Barcodelookup",
+                "nom": product.get("title") or product.get("product_name") or "Produit sans nom",
+                "marque": product.get("brand") or product.get("manufacturer"),
+                "description": product.get("description") or product.get("category")
+            }
+    return None
+
+# Ordre d'interrogation : OpenFoodFacts d'abord (gratuit, illimité)
+FOURNISSEURS = [
+    ("OpenFoodFacts", interroger_openfoodfacts),
+    ("Barcodelookup", interroger_barcodelookup),
+]
+
 @router.get("/{ean}")
 async def rechercher_ean(ean: str):
     """Rechercher un produit par son code EAN via OpenFoodFacts puis Barcodelookup"""
-    
-    # 1. Essayer OpenFoodFacts d'abord (gratuit, illimité)
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://world.openfoodfacts.org/api/v0/product/{ean}.json",
-                timeout=5.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == 1:
-                    product = data.get("product", {})
-                    
-                    return {
-                        "source": "OpenFoodFacts",
-                        "nom": product.get("product_name") or product.get("product_name_fr") or "Produit sans nom",
-                        "marque": product.get("brands"),
-                        "description": product.get("generic_name") or product.get("categories")
-                    }
-    except Exception as e:
-        print(f"Erreur OpenFoodFacts: {e}")
-    
-    # 2. Essayer Barcodelookup (100 requêtes/jour)
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.barcodelookup.com/v3/products",
-                params={"barcode": ean, "key": BARCODELOOKUP_API_KEY},
-                timeout=5.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                products = data.get("products", [])
-                
-                if products:
-                    product = products[0]
-                    
-                    return {
-                        "source": "Barcodelookup",
-                        "nom": product.get("title") or product.get("product_name") or "Produit sans nom",
-                        "marque": product.get("brand") or product.get("manufacturer"),
-                        "description": product.get("description") or product.get("category")
-                    }
-    except Exception as e:
-        print(f"Erreur Barcodelookup: {e}")
-    
+
+    async with httpx.AsyncClient() as client:
+        for nom, interroger in FOURNISSEURS:
+            try:
+                resultat = await interroger(client, ean)
+                if resultat:
+                    return resultat
+            except Exception as e:
+                print(f"Erreur {nom}: {e}")
+
     # Aucune source n'a trouvé le produit
     raise HTTPException(status_code=404, detail="Produit non trouvé")
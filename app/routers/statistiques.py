@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.database import get_db
+from app.analytique import previsions
+
+router = APIRouter(prefix="/statistiques", tags=["Statistiques"])
+
+@router.get("/consommation")
+def statistiques_consommation(
+    fenetre_jours: int = Query(30, ge=1, le=365),
+    moyenne_jours: int = Query(7, ge=1),
+    produit_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Rythme de consommation et jours de stock restants par produit
+    - taux_journalier : moyenne sur fenetre_jours
+    - moyenne_mobile : moyenne sur les moyenne_jours derniers jours
+    - quantite_perimee_avant_consommation : stock qui périmera avant d'être consommé
+    """
+    resultat = previsions(db, fenetre_jours, moyenne_jours)
+    if produit_id:
+        resultat = [p for p in resultat if p["produit_id"] == produit_id]
+    return resultat
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 # === PRODUIT ===
 class ProduitBase(BaseModel):
@@ -26,6 +26,16 @@ class Produit(ProduitBase):
     class Config:
         from_attributes = True
 
+class ProduitStock(Produit):
+    nb_articles: int
+    quantite_totale: int
+    nb_emplacements: int
+    peremption_proche: Optional[datetime] = None
+
+class PageProduitStock(BaseModel):
+    produits: List[ProduitStock]
+    curseur_suivant: Optional[str] = None
+
 # === EMPLACEMENT ===
 class EmplacementBase(BaseModel):
     code_emplacement: str = Field(..., pattern="^[Ee][Mm][Pp][0-9]{3}$")
@@ -93,3 +103,34 @@ class ArticleDetail(ArticleBase):
     
     class Config:
         from_attributes = True
+
+# === FEFO (premier périmé, premier sorti) ===
+class ConsommationFefo(BaseModel):
+    ean: Optional[str] = None
+    produit_id: Optional[int] = None
+    emplacement_id: Optional[int] = None
+    quantite: int = Field(..., ge=1)
+
+class LigneFefo(BaseModel):
+    article_id: int
+    code_article: str
+    emplacement_id: int
+    quantite: int
+    date_peremption: Optional[datetime] = None
+    created_at: datetime
+    quantite_a_retirer: Optional[int] = None
+
+class PlanFefo(BaseModel):
+    produit_id: int
+    quantite_demandee: Optional[int] = None
+    quantite_couverte: int
+    complet: bool
+    articles: List[LigneFefo]
+
+# === PROJECTIONS (?fields= / ?expand= / ?format=compact) ===
+# Objet réduit aux champs demandés (relations étendues imbriquées)
+ObjetPartiel = Dict[str, Any]
+
+class ListeCompacte(BaseModel):
+    colonnes: List[str]
+    lignes: List[List[Any]]
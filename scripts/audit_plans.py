@@ -0,0 +1,178 @@
+"""
+Audit des plans de requêtes des routers (garde-fou contre les scans complets)
+
+Crée une base SQLite temporaire remplie de données, appelle chaque endpoint,
+capture toutes les requêtes SQL émises et les passe à EXPLAIN QUERY PLAN.
+Échoue (code de sortie 1) si un endpoint ne répond pas le statut attendu ou
+si une requête d'un endpoint « chaud » parcourt entièrement une table (SCAN)
+au lieu d'utiliser un index (SEARCH).
+
+Usage :
+    python scripts/audit_plans.py [-v]
+"""
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+BASE_TEMPORAIRE = os.path.join(tempfile.mkdtemp(), "audit.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{BASE_TEMPORAIRE}"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.database import Base, SessionLocal, engine, initialiser_schema  # noqa: E402
+from app.models import Article, Consommation, Emplacement, Produit  # noqa: E402
+from app.routers import articles, emplacements, export, produits, statistiques  # noqa: E402
+
+NB_PRODUITS = 200
+NB_ARTICLES = 2000
+
+# (méthode, url, corps JSON, statut attendu, scan complet autorisé)
+# Les listes complètes, l'export et les statistiques lisent tout par nature.
+# Les 400 attendus sont les gardes de suppression (comptage des articles).
+SCENARIOS = [
+    ("GET", "/produits/", None, 200, True),
+    ("GET", "/produits/?fields=ean,nom&format=compact", None, 200, True),
+    ("GET", "/produits/stock?statut=faible&tri=quantite", None, 200, True),
+    ("GET", "/produits/5", None, 200, False),
+    ("GET", "/produits/5?fields=nom", None, 200, False),
+    ("GET", "/produits/ean/3000000000005", None, 200, False),
+    ("POST", "/produits/", {"nom": "Nouveau", "ean": "3999999999999"}, 200, False),
+    ("PUT", "/produits/6", {"marque": "Audit"}, 200, False),
+    ("DELETE", "/produits/5", None, 400, False),
+    ("DELETE", f"/produits/{NB_PRODUITS + 1}", None, 200, False),
+    ("GET", "/emplacements/", None, 200, True),
+    ("GET", "/emplacements/?niveau=2", None, 200, True),
+    ("GET", "/emplacements/?parent_id=1", None, 200, False),
+    ("GET", "/emplacements/2", None, 200, False),
+    ("GET", "/emplacements/2?expand=parent", None, 200, False),
+    ("GET", "/emplacements/code/EMP003", None, 200, False),
+    ("GET", "/emplacements/1/enfants", None, 200, False),
+    ("GET", "/emplacements/1/hierarchie", None, 200, False),
+    ("POST", "/emplacements/", {"code_emplacement": "EMP999", "nom": "Audit", "parent_id": 1}, 200, False),
+    ("PUT", "/emplacements/3", {"nom": "Renommé"}, 200, False),
+    ("DELETE", "/emplacements/2", None, 400, False),
+    ("GET", "/articles/", None, 200, True),
+    ("GET", "/articles/?produit_id=7", None, 200, False),
+    ("GET", "/articles/?emplacement_id=4", None, 200, False),
+    ("GET", "/articles/?produit_id=7&fields=code_article,quantite,produit.nom", None, 200, False),
+    ("GET", "/articles/10", None, 200, False),
+    ("GET", "/articles/10?fields=code_article&expand=emplacement", None, 200, False),
+    ("GET", "/articles/code/GG0011", None, 200, False),
+    ("POST", "/articles/", {"code_article": "GG9999", "produit_id": 8, "emplacement_id": 4}, 200, False),
+    ("PUT", "/articles/12?quantite=3", None, 200, False),
+    ("DELETE", "/articles/13?quantite_a_retirer=1", None, 200, False),
+    ("DELETE", "/articles/14", None, 200, False),
+    ("GET", "/articles/peremption/prochaines", None, 200, False),
+    ("GET", "/articles/peremption/expirees", None, 200, False),
+    ("GET", "/articles/fefo/recommandation?produit_id=9&quantite=2", None, 200, False),
+    ("GET", "/articles/fefo/recommandation?produit_id=9&emplacement_id=1", None, 200, False),
+    ("POST", "/articles/fefo/appliquer", {"produit_id": 9, "quantite": 1}, 200, False),
+    ("GET", "/export/articles", None, 200, True),
+    ("GET", "/statistiques/consommation", None, 200, True),
+]
+
+def remplir():
+    """Arbre d'emplacements, produits, articles et historique de consommation"""
+    maintenant = datetime.utcnow()
+    db = SessionLocal()
+    pieces = [Emplacement(code_emplacement=f"EMP{i:03d}", nom=f"Pièce {i}", niveau=1) for i in range(1, 6)]
+    db.add_all(pieces)
+    db.flush()
+    meubles = [
+        Emplacement(code_emplacement=f"EMP{i:03d}", nom=f"Meuble {i}", niveau=2, parent_id=pieces[i % 5].id)
+        for i in range(6, 60)
+    ]
+    db.add_all(meubles)
+    db.add_all(Produit(nom=f"Produit {i}", ean=f"{3000000000000 + i}") for i in range(1, NB_PRODUITS + 1))
+    db.flush()
+
+    emplacement_ids = [e.id for e in pieces + meubles]
+    db.add_all(
+        Article(
+            code_article=f"GG{i:04d}",
+            produit_id=i % NB_PRODUITS + 1,
+            emplacement_id=emplacement_ids[i % len(emplacement_ids)],
+            quantite=1 + i % 5,
+            date_peremption=maintenant + timedelta(days=i % 400 - 30) if i % 3 else None
+        )
+        for i in range(1, NB_ARTICLES + 1)
+    )
+    db.add_all(
+        Consommation(produit_id=i % NB_PRODUITS + 1, quantite=1, horodatage=maintenant - timedelta(hours=i))
+        for i in range(1000)
+    )
+    db.add(Produit(nom="Sans article", ean="3888888888888"))
+    db.commit()
+    db.close()
+
+def plan(connexion, requete, parametres):
+    lignes = connexion.exec_driver_sql("EXPLAIN QUERY PLAN " + requete, parametres).all()
+    return [ligne[-1] for ligne in lignes]
+
+def scans_complets(details, tables):
+    """Tables parcourues entièrement (SCAN sur une vraie table, hors CTE)"""
+    resultat = []
+    for detail in details:
+        correspondance = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+        if correspondance and correspondance.group(1) in tables:
+            resultat.append(detail)
+    return resultat
+
+def main():
+    verbeux = "-v" in sys.argv
+    initialiser_schema()
+    remplir()
+
+    app = FastAPI()
+    for module in (produits, emplacements, articles, export, statistiques):
+        app.include_router(module.router)
+    client = TestClient(app)
+
+    capturees = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capturer(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            capturees.append((statement, parameters))
+
+    tables = set(Base.metadata.tables)
+    echecs = 0
+
+    for methode, url, corps, statut_attendu, scan_autorise in SCENARIOS:
+        capturees.clear()
+        reponse = client.request(methode, url, json=corps)
+        requetes = list(capturees)
+
+        # Un statut inattendu signifie que la requête testée n'a peut-être pas tourné
+        if reponse.status_code != statut_attendu:
+            echecs += 1
+            print(f"❌ {methode} {url} : statut {reponse.status_code} au lieu de {statut_attendu}")
+            print(f"   {reponse.text[:200]}")
+
+        with engine.connect() as connexion:
+            for requete, parametres in requetes:
+                details = plan(connexion, requete, parametres)
+                scans = scans_complets(details, tables)
+                en_echec = scans and not scan_autorise
+                echecs += bool(en_echec)
+
+                if en_echec or verbeux:
+                    statut = "❌" if en_echec else ("⚠️ " if scans else "✅")
+                    print(f"{statut} {methode} {url} [{reponse.status_code}]")
+                    print("   " + " ".join(requete.split())[:200])
+                    for detail in details:
+                        print(f"      {detail}")
+
+    print()
+    if echecs:
+        print(f"❌ {echecs} échec(s) : statut inattendu ou scan complet sur un endpoint chaud")
+        sys.exit(1)
+    print(f"✅ {len(SCENARIOS)} endpoints audités, statuts attendus et aucun scan complet inattendu")
+
+if __name__ == "__main__":
+    main()
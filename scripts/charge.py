@@ -0,0 +1,328 @@
+"""
+Test de charge de bout en bout : N scanneurs mobiles concurrents
+
+Chaque scanneur rejoue en boucle les parcours des pages mobiles :
+- entrée (entree.html) : chargement de la page, recherche de l'EAN, recherche
+  externe et création du produit s'il est inconnu, création de l'article
+- sortie (sortie.html) : chargement de la page, recherche par code article,
+  retrait d'une unité, puis suppression (le code est libéré et réutilisé)
+Après un échec en cours de parcours, l'article éventuellement créé est
+supprimé (étape nettoyage) pour rendre le code ; sinon le code est compté perdu.
+
+À lancer contre une instance de test (scripts/start.sh) dont la recherche EAN
+pointe vers le faux fournisseur local (scripts/faux_fournisseurs.py) :
+
+    python scripts/faux_fournisseurs.py --latence-ms 150 --taux-erreur 0.02 &
+    DDB_OPENFOODFACTS_URL=http://127.0.0.1:9000/api/v0/product/{ean}.json \\
+    DDB_BARCODELOOKUP_URL=http://127.0.0.1:9000/v3/products \\
+        scripts/start.sh prod
+
+    python scripts/charge.py --paliers 1,4,16,32 --duree 30
+
+Affiche par palier et par étape : débit, taux d'erreur, percentiles et
+histogramme des latences. --json enregistre les résultats bruts agrégés.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+# Bornes supérieures des classes de l'histogramme (ms)
+CLASSES_MS = [5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf")]
+
+ETAPES = [
+    "chargement_entree", "recherche_ean", "recherche_externe", "creation_produit",
+    "creation_article", "chargement_sortie", "recherche_code", "retrait", "suppression",
+    "nettoyage",
+]
+
+class Mesures:
+    """Latences et erreurs par étape pour un palier"""
+
+    def __init__(self):
+        self.latences = defaultdict(list)
+        self.erreurs = defaultdict(int)
+        self.exemples_erreurs = defaultdict(set)
+        self.sessions = 0
+        self.codes_perdus = 0      # article peut-être resté en base après un échec
+        self.attentes_code = 0     # aucun code libre dans le délai
+        self.debut = time.perf_counter()
+        self.fin = None
+
+    def enregistrer(self, etape, duree, erreur=None):
+        self.latences[etape].append(duree * 1000)
+        if erreur:
+            self.erreurs[etape] += 1
+            if len(self.exemples_erreurs[etape]) < 3:
+                self.exemples_erreurs[etape].add(erreur)
+
+    def duree(self):
+        return (self.fin or time.perf_counter()) - self.debut
+
+def percentile(valeurs_triees, p):
+    if not valeurs_triees:
+        return 0.0
+    rang = min(len(valeurs_triees) - 1, int(round(p / 100 * (len(valeurs_triees) - 1))))
+    return valeurs_triees[rang]
+
+def histogramme(valeurs):
+    comptes = [0] * len(CLASSES_MS)
+    for valeur in valeurs:
+        for i, borne in enumerate(CLASSES_MS):
+            if valeur <= borne:
+                comptes[i] += 1
+                break
+    return comptes
+
+class Scanneur:
+    """Un téléphone : parcours d'entrée puis de sortie, en boucle"""
+
+    def __init__(self, client, contexte, mesures, pause):
+        self.client = client
+        self.contexte = contexte
+        self.mesures = mesures
+        self.pause = pause
+
+    async def appel(self, etape, methode, url, attendus=(200,), **kwargs):
+        """Requête chronométrée ; retourne la réponse (None si erreur réseau)"""
+        debut = time.perf_counter()
+        try:
+            reponse = await self.client.request(methode, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.mesures.enregistrer(etape, time.perf_counter() - debut, type(e).__name__)
+            return None
+        erreur = None if reponse.status_code in attendus else f"HTTP {reponse.status_code}"
+        self.mesures.enregistrer(etape, time.perf_counter() - debut, erreur)
+        if self.pause:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.pause)
+        return reponse
+
+    async def produit_pour_ean(self, ean):
+        """Scan d'un EAN : produit connu, sinon recherche externe et création"""
+        reponse = await self.appel("recherche_ean", "GET", f"/produits/ean/{ean}", attendus=(200, 404))
+        if reponse is None:
+            return None
+        if reponse.status_code == 200:
+            return reponse.json()
+
+        externe = await self.appel("recherche_externe", "GET", f"/recherche-ean/{ean}", attendus=(200, 404))
+        if externe is not None and externe.status_code == 200:
+            infos = externe.json()
+            donnees = {"ean": ean, "nom": infos["nom"], "marque": infos.get("marque"),
+                       "description": infos.get("description")}
+        else:
+            # Saisie manuelle du nom sur le téléphone
+            donnees = {"ean": ean, "nom": f"Produit saisi {ean}", "marque": None, "description": None}
+
+        creation = await self.appel("creation_produit", "POST", "/produits/", json=donnees)
+        if creation is None or creation.status_code != 200:
+            return None
+        # Connu des autres scanneurs seulement une fois créé
+        self.contexte["connus"].append(ean)
+        return creation.json()
+
+    async def session(self):
+        contexte = self.contexte
+        if contexte["pages"]:
+            await self.appel("chargement_entree", "GET", "/emplacements/")
+            await self.appel("chargement_entree", "GET", "/produits/")
+
+        produit = await self.produit_pour_ean(contexte["tirer_ean"]())
+        if produit is None:
+            return
+
+        try:
+            code = await asyncio.wait_for(contexte["codes"].get(), contexte["attente_code"])
+        except asyncio.TimeoutError:
+            self.mesures.attentes_code += 1
+            return
+
+        libere = False
+        try:
+            quantite = random.randint(2, 5)
+            creation = await self.appel("creation_article", "POST", "/articles/", json={
+                "code_article": code,
+                "produit_id": produit["id"],
+                "emplacement_id": random.choice(contexte["emplacements"]),
+                "quantite": quantite,
+                "date_peremption": None,
+                "commentaire": "test de charge"
+            })
+            if creation is None or creation.status_code != 200:
+                return
+
+            if contexte["pages"]:
+                await self.appel("chargement_sortie", "GET", "/articles/")
+            trouve = await self.appel("recherche_code", "GET", f"/articles/code/{code}")
+            if trouve is None or trouve.status_code != 200:
+                return
+            article_id = trouve.json()["id"]
+
+            await self.appel("retrait", "DELETE", f"/articles/{article_id}?quantite_a_retirer=1")
+            suppression = await self.appel("suppression", "DELETE", f"/articles/{article_id}")
+            libere = suppression is not None and suppression.status_code == 200
+            self.mesures.sessions += 1
+        finally:
+            # Code libéré par la suppression, sinon par le nettoyage : réutilisable
+            if not libere:
+                libere = await self.nettoyer(code)
+            if libere:
+                contexte["codes"].put_nowait(code)
+            else:
+                self.mesures.codes_perdus += 1
+
+    async def nettoyer(self, code, tentatives=3):
+        """Supprimer l'article resté sous ce code ; True si le code est libre"""
+        for _ in range(tentatives):
+            trouve = await self.appel("nettoyage", "GET", f"/articles/code/{code}", attendus=(200, 404))
+            if trouve is not None and trouve.status_code == 404:
+                return True
+            if trouve is not None and trouve.status_code == 200:
+                # Réponse perdue : la suppression a pu aboutir, revérifier au tour suivant
+                await self.appel("nettoyage", "DELETE", f"/articles/{trouve.json()['id']}")
+        return False
+
+    async def boucle(self, echeance):
+        while time.perf_counter() < echeance:
+            await self.session()
+
+async def preparer(client, args):
+    """Codes article libres, emplacements et EAN connus de l'instance cible"""
+    reponse = await client.get("/articles/", params={"fields": "code_article", "format": "compact", "limit": 10000})
+    reponse.raise_for_status()
+    pris = {ligne[0] for ligne in reponse.json()["lignes"]}
+    codes = asyncio.Queue()
+    for numero in range(10000):
+        code = f"GG{numero:04d}"
+        if code not in pris:
+            codes.put_nowait(code)
+
+    reponse = await client.get("/emplacements/", params={"fields": "id", "format": "compact", "limit": 1000})
+    reponse.raise_for_status()
+    emplacements = [ligne[0] for ligne in reponse.json()["lignes"]]
+    if not emplacements:
+        reponse = await client.post("/emplacements/", json={"code_emplacement": "EMP999", "nom": "Test de charge"})
+        reponse.raise_for_status()
+        emplacements = [reponse.json()["id"]]
+
+    reponse = await client.get("/produits/", params={"fields": "ean", "format": "compact", "limit": 10000})
+    reponse.raise_for_status()
+    connus = [ligne[0] for ligne in reponse.json()["lignes"] if ligne[0]]
+
+    # EAN nouveaux propres à cette exécution (préfixe 2 : usage interne GS1)
+    prefixe = f"2{random.randint(0, 999):03d}"
+    compteur = iter(range(10 ** 9))
+
+    def tirer_ean():
+        if connus and random.random() >= args.part_nouveaux:
+            return random.choice(connus)
+        return f"{prefixe}{next(compteur):09d}"
+
+    return {"codes": codes, "emplacements": emplacements, "connus": connus,
+            "tirer_ean": tirer_ean, "pages": not args.sans_pages, "attente_code": args.timeout}
+
+async def palier(args, contexte, scanneurs):
+    mesures = Mesures()
+    limites = httpx.Limits(max_connections=scanneurs, max_keepalive_connections=scanneurs)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=args.timeout) as client:
+        echeance = time.perf_counter() + args.duree
+        await asyncio.gather(*(
+            Scanneur(client, contexte, mesures, args.pause_ms / 1000).boucle(echeance)
+            for _ in range(scanneurs)
+        ))
+    mesures.fin = time.perf_counter()
+    return mesures
+
+def resume(scanneurs, mesures):
+    """Tableau par étape et dictionnaire des résultats du palier"""
+    duree = mesures.duree()
+    resultat = {"scanneurs": scanneurs, "duree_s": round(duree, 1), "sessions": mesures.sessions,
+                "sessions_par_s": round(mesures.sessions / duree, 2), "etapes": {}}
+
+    print(f"\n=== {scanneurs} scanneur(s) : {mesures.sessions} sessions en {duree:.1f} s "
+          f"({resultat['sessions_par_s']} sessions/s) ===")
+    resultat.update(codes_perdus=mesures.codes_perdus, attentes_code=mesures.attentes_code)
+    if mesures.codes_perdus or mesures.attentes_code:
+        print(f"⚠️ {mesures.codes_perdus} code(s) article perdu(s), "
+              f"{mesures.attentes_code} attente(s) de code libre abandonnée(s)")
+    print(f"{'étape':<19}{'req':>7}{'req/s':>8}{'err %':>7}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}  (ms)")
+    for etape in ETAPES:
+        valeurs = sorted(mesures.latences.get(etape, []))
+        if not valeurs:
+            continue
+        erreurs = mesures.erreurs.get(etape, 0)
+        ligne = {
+            "requetes": len(valeurs),
+            "debit": round(len(valeurs) / duree, 2),
+            "taux_erreur": round(erreurs / len(valeurs), 4),
+            "p50": round(percentile(valeurs, 50), 1),
+            "p95": round(percentile(valeurs, 95), 1),
+            "p99": round(percentile(valeurs, 99), 1),
+            "max": round(valeurs[-1], 1),
+            "histogramme": dict(zip(map(str, CLASSES_MS), histogramme(valeurs))),
+            "exemples_erreurs": sorted(mesures.exemples_erreurs.get(etape, ())),
+        }
+        resultat["etapes"][etape] = ligne
+        print(f"{etape:<19}{ligne['requetes']:>7}{ligne['debit']:>8}{ligne['taux_erreur'] * 100:>7.1f}"
+              f"{ligne['p50']:>8}{ligne['p95']:>8}{ligne['p99']:>8}{ligne['max']:>8}"
+              + (f"  {', '.join(ligne['exemples_erreurs'])}" if erreurs else ""))
+    return resultat
+
+def afficher_histogrammes(resultat):
+    print("\nHistogrammes des latences (ms)")
+    for etape, ligne in resultat["etapes"].items():
+        total = ligne["requetes"]
+        print(f"  {etape}")
+        for borne, compte in ligne["histogramme"].items():
+            if compte:
+                barre = "█" * max(1, round(40 * compte / total))
+                print(f"    <= {borne:>5} {compte:>7} {barre}")
+
+async def executer(args):
+    paliers = [int(n) for n in args.paliers.split(",")]
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        contexte = await preparer(client, args)
+
+    resultats = []
+    for scanneurs in paliers:
+        mesures = await palier(args, contexte, scanneurs)
+        resultat = resume(scanneurs, mesures)
+        if args.histogrammes:
+            afficher_histogrammes(resultat)
+        resultats.append(resultat)
+
+    if len(resultats) > 1:
+        print("\n=== p99 (ms) par palier ===")
+        print(f"{'étape':<19}" + "".join(f"{r['scanneurs']:>9}" for r in resultats))
+        for etape in ETAPES:
+            if any(etape in r["etapes"] for r in resultats):
+                print(f"{etape:<19}" + "".join(
+                    f"{r['etapes'][etape]['p99'] if etape in r['etapes'] else '-':>9}" for r in resultats
+                ))
+    return resultats
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge : scanneurs mobiles concurrents")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--paliers", default="1,4,16", help="Nombres de scanneurs successifs, ex. 1,4,16,32")
+    parser.add_argument("--duree", type=float, default=30, help="Durée de chaque palier (s)")
+    parser.add_argument("--pause-ms", type=float, default=0, help="Temps de réflexion moyen entre deux appels")
+    parser.add_argument("--part-nouveaux", type=float, default=0.2, help="Part des EAN inconnus de la base")
+    parser.add_argument("--sans-pages", action="store_true", help="Ne pas rejouer les chargements de page")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--histogrammes", action="store_true", help="Afficher les histogrammes de latence")
+    parser.add_argument("--json", help="Enregistrer les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    resultats = asyncio.run(executer(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fichier:
+            json.dump(resultats, fichier, ensure_ascii=False, indent=2)
+        print(f"\n💾 Résultats enregistrés dans {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Faux OpenFoodFacts / Barcodelookup pour les tests de charge
+
+Répond aux mêmes URL que les vrais fournisseurs, avec une latence et des
+pannes injectables, sans dépendre d'Internet ni consommer les quotas.
+
+Usage :
+    python scripts/faux_fournisseurs.py [--port 9000] [--latence-ms 150] [--gigue-ms 50]
+        [--taux-erreur 0.02] [--taux-quota 0.01] [--taux-lent 0.01] [--latence-lente-ms 6000]
+        [--taux-inconnu 0.2]
+
+Puis lancer l'API avec :
+    DDB_OPENFOODFACTS_URL=http://127.0.0.1:9000/api/v0/product/{ean}.json
+    DDB_BARCODELOOKUP_URL=http://127.0.0.1:9000/v3/products
+"""
+import argparse
+import asyncio
+import random
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Faux fournisseurs EAN")
+
+# Paramètres d'injection (modifiables à chaud par POST /config)
+CONFIG = {
+    "latence_ms": 150.0,
+    "gigue_ms": 50.0,
+    "taux_erreur": 0.0,        # HTTP 500
+    "taux_quota": 0.0,         # HTTP 429
+    "taux_lent": 0.0,          # réponse après latence_lente_ms (timeout côté API à 5 s)
+    "latence_lente_ms": 6000.0,
+    "taux_inconnu": 0.2,       # EAN introuvable
+}
+compteurs = Counter()
+
+async def _simuler(fournisseur, ean):
+    """Attendre la latence tirée au sort ; retourner une réponse d'erreur ou None"""
+    compteurs[f"{fournisseur}.appels"] += 1
+    latence = CONFIG["latence_ms"] + random.uniform(-1, 1) * CONFIG["gigue_ms"]
+    if random.random() < CONFIG["taux_lent"]:
+        latence = CONFIG["latence_lente_ms"]
+        compteurs[f"{fournisseur}.lents"] += 1
+    await asyncio.sleep(max(latence, 0) / 1000)
+
+    tirage = random.random()
+    if tirage < CONFIG["taux_erreur"]:
+        compteurs[f"{fournisseur}.erreurs"] += 1
+        return JSONResponse({"error": "erreur simulée"}, status_code=500)
+    if tirage < CONFIG["taux_erreur"] + CONFIG["taux_quota"]:
+        compteurs[f"{fournisseur}.quotas"] += 1
+        return JSONResponse({"error": "quota simulé"}, status_code=429)
+    return None
+
+def _inconnu(ean):
+    """Tirage stable par EAN : un même code reste connu ou inconnu"""
+    return random.Random(ean).random() < CONFIG["taux_inconnu"]
+
+@app.get("/api/v0/product/{ean}.json")
+async def openfoodfacts(ean: str):
+    erreur = await _simuler("openfoodfacts", ean)
+    if erreur:
+        return erreur
+    if _inconnu(ean):
+        return {"status": 0, "status_verbose": "product not found"}
+    return {
+        "status": 1,
+        "product": {
+            "product_name": f"Produit {ean}",
+            "brands": f"Marque {ean[-3:]}",
+            "generic_name": "Produit de test de charge"
+        }
+    }
+
+@app.get("/v3/products")
+async def barcodelookup(barcode: str, key: str = ""):
+    erreur = await _simuler("barcodelookup", barcode)
+    if erreur:
+        return erreur
+    if _inconnu(barcode + "bl"):
+        return JSONResponse({"products": []}, status_code=404)
+    return {
+        "products": [{
+            "title": f"Article {barcode}",
+            "brand": f"Fabricant {barcode[-3:]}",
+            "description": "Produit de test de charge"
+        }]
+    }
+
+@app.get("/stats")
+def stats():
+    return dict(compteurs)
+
+@app.post("/config")
+def configurer(valeurs: dict):
+    """Modifier l'injection pendant un test, ex. {"taux_erreur": 0.5}"""
+    for cle, valeur in valeurs.items():
+        if cle in CONFIG:
+            CONFIG[cle] = float(valeur)
+    return CONFIG
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux fournisseurs EAN à latence et pannes injectables")
+    parser.add_argument("--hote", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    for cle, defaut in CONFIG.items():
+        parser.add_argument("--" + cle.replace("_", "-"), type=float, default=defaut)
+    args = parser.parse_args()
+
+    for cle in CONFIG:
+        CONFIG[cle] = getattr(args, cle)
+    print(f"🧪 Faux fournisseurs sur http://{args.hote}:{args.port} {CONFIG}")
+    uvicorn.run(app, host=args.hote, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# Configuration Gunicorn pour le mode production DDB-Stock
+# Lancement : gunicorn -c scripts/gunicorn.conf.py app.main:app
+# Redémarrage gracieux : kill -HUP <pid maître>
+import multiprocessing
+import os
+
+bind = os.getenv("DDB_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("DDB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Redémarrage gracieux : les requêtes en cours ont ce délai pour se terminer
+graceful_timeout = int(os.getenv("DDB_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("DDB_TIMEOUT", "60"))
+keepalive = 5
+
+# Recycler les workers régulièrement (fuites mémoire éventuelles)
+max_requests = int(os.getenv("DDB_MAX_REQUESTS", "2000"))
+max_requests_jitter = 200
+
+accesslog = "-"
+errorlog = "-"
+
+# Le schéma est créé avant le lancement par scripts/start.sh (python -m app.database) :
+# le maître n'importe aucun module de l'application, les workers relancés après un
+# kill -HUP chargent donc le code à jour
@@ -1,12 +1,24 @@
 #!/bin/bash
 # Script de démarrage DDB-Stock
+# Usage : start.sh [dev|prod]
+#   dev  (défaut) : un seul processus uvicorn avec --reload
+#   prod          : gunicorn + N workers uvicorn (DDB_WORKERS), redémarrage gracieux par SIGHUP
+
+MODE=${1:-dev}
 
 cd /opt/ddb-stock
 source venv/bin/activate
 
-echo "🚀 Démarrage DDB-Stock API..."
+echo "🚀 Démarrage DDB-Stock API ($MODE)..."
 echo "📡 API: http://$(hostname -I | awk '{print $1}'):8000"
 echo "📚 Docs: http://$(hostname -I | awk '{print $1}'):8000/docs"
 echo ""
 
-uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
+# Créer les tables et index manquants avant le serveur (un seul processus)
+python -m app.database || exit 1
+
+if [ "$MODE" = "prod" ]; then
+    exec gunicorn -c scripts/gunicorn.conf.py app.main:app
+else
+    uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
+fi
@@ -0,0 +1,180 @@
+"""
+Vérification de l'enrichissement EAN avec des fournisseurs simulés
+
+Crée une base SQLite temporaire et pilote app.enrichissement.enrichir()
+avec des fournisseurs locaux (aucun appel réseau). Vérifie :
+- seuls les champs vides sont complétés (saisie manuelle conservée)
+- réessai après ErreurFournisseur
+- repli sur le second fournisseur si le premier ne connaît pas l'EAN
+- saut d'un fournisseur dont le quota est épuisé, sans attendre, et nouvel
+  essai des produits reportés au passage suivant
+- réponse illisible : repli, produit compté en erreur, lot tout de même écrit
+- reprise depuis le curseur enregistré après une interruption
+
+Usage :
+    python scripts/verifier_enrichissement.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BASE_TEMPORAIRE = os.path.join(tempfile.mkdtemp(), "enrichissement.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{BASE_TEMPORAIRE}"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import httpx  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+
+from app.database import SessionLocal, initialiser_schema  # noqa: E402
+from app.enrichissement import SeauJetons, enrichir, lire_curseur  # noqa: E402
+from app.models import Produit, ProgressionTache  # noqa: E402
+from app.routers.recherche_ean import ErreurFournisseur  # noqa: E402
+
+class FauxFournisseur:
+    """interroger(client, ean) : réponses par EAN, erreurs temporaires injectables"""
+
+    def __init__(self, nom, produits, erreurs=None, panne_apres=None):
+        self.nom = nom
+        self.produits = produits
+        self.erreurs = dict(erreurs or {})  # ean -> nombre d'échecs avant succès
+        self.panne_apres = panne_apres      # interrompre la tâche après N appels
+        self.appels = []
+
+    async def __call__(self, client, ean):
+        self.appels.append(ean)
+        if self.panne_apres is not None and len(self.appels) > self.panne_apres:
+            raise asyncio.CancelledError("interruption simulée")
+        if self.erreurs.get(ean):
+            self.erreurs[ean] -= 1
+            raise ErreurFournisseur("HTTP 503")
+        infos = self.produits.get(ean)
+        return {"source": self.nom, **infos} if infos else None
+
+def fournisseurs(*faux, debits=None):
+    debits = debits or {}
+    return [(f.nom, f, SeauJetons(debits.get(f.nom, 1000), capacite=1000)) for f in faux]
+
+def remplir(produits):
+    with SessionLocal() as session:
+        session.execute(delete(Produit))
+        session.execute(delete(ProgressionTache))
+        session.add_all(Produit(**p) for p in produits)
+        session.commit()
+
+def lire(ean):
+    with SessionLocal() as session:
+        produit = session.query(Produit).filter(Produit.ean == ean).one()
+        return produit.marque, produit.description
+
+def lancer(fournisseurs, **options):
+    options.setdefault("client", httpx.AsyncClient())
+    options.setdefault("delai_base", 0.01)
+    return asyncio.run(enrichir(fournisseurs=fournisseurs, **options))
+
+echecs = []
+
+def verifier(condition, message):
+    print(("✅ " if condition else "❌ ") + message)
+    if not condition:
+        echecs.append(message)
+
+def cas_champs_vides():
+    remplir([
+        {"nom": "Manuel", "ean": "001", "marque": "Saisie", "description": None},
+        {"nom": "Vide", "ean": "002"},
+    ])
+    off = FauxFournisseur("OpenFoodFacts", {
+        "001": {"nom": "X", "marque": "Externe", "description": "Desc 1"},
+        "002": {"nom": "Y", "marque": "Marque 2", "description": "Desc 2"},
+    })
+    stats = lancer(fournisseurs(off))
+    verifier(lire("001") == ("Saisie", "Desc 1"), "marque saisie conservée, description complétée")
+    verifier(lire("002") == ("Marque 2", "Desc 2"), "produit vide entièrement complété")
+    verifier(stats["enrichis"] == 2, f"2 produits enrichis ({stats})")
+
+def cas_reessai():
+    remplir([{"nom": "Instable", "ean": "010"}])
+    off = FauxFournisseur("OpenFoodFacts", {"010": {"nom": "Z", "marque": "M", "description": "D"}},
+                          erreurs={"010": 2})
+    lancer(fournisseurs(off), tentatives=3)
+    verifier(len(off.appels) == 3, f"2 erreurs temporaires puis succès ({len(off.appels)} appels)")
+    verifier(lire("010") == ("M", "D"), "produit enrichi après réessai")
+
+def cas_repli():
+    remplir([{"nom": "Inconnu OFF", "ean": "020"}])
+    off = FauxFournisseur("OpenFoodFacts", {})
+    bl = FauxFournisseur("Barcodelookup", {"020": {"nom": "B", "marque": "BL", "description": "Via BL"}})
+    lancer(fournisseurs(off, bl))
+    verifier(off.appels == ["020"] and bl.appels == ["020"], "OpenFoodFacts puis Barcodelookup interrogés")
+    verifier(lire("020") == ("BL", "Via BL"), "produit enrichi par le second fournisseur")
+
+def cas_quota_epuise():
+    remplir([{"nom": f"P{i}", "ean": f"03{i}"} for i in range(4)])
+    off = FauxFournisseur("OpenFoodFacts", {})
+    bl = FauxFournisseur("Barcodelookup", {f"03{i}": {"nom": "B", "marque": "BL", "description": "D"} for i in range(4)})
+    liste = fournisseurs(off)
+    liste.append(("Barcodelookup", bl, SeauJetons(100 / 86400)))  # 1 jeton puis ~864 s d'attente
+    debut = time.monotonic()
+    stats = lancer(liste, attente_max=1)
+    verifier(time.monotonic() - debut < 5, "pas d'attente du prochain jeton Barcodelookup")
+    verifier(len(bl.appels) == 1 and stats["reportes"] == 3, f"1 appel, 3 produits reportés ({stats})")
+    verifier(lire_curseur(SessionLocal) == 0, "curseur remis à zéro à la fin du passage")
+
+    # Passage suivant, quota rétabli : les produits reportés sont réessayés
+    bl = FauxFournisseur("Barcodelookup", bl.produits)
+    lancer(fournisseurs(off, bl))
+    verifier(len(bl.appels) == 3, f"3 produits reportés réessayés ({len(bl.appels)} appels)")
+    verifier(all(lire(f"03{i}") == ("BL", "D") for i in range(4)), "tous les produits enrichis au second passage")
+
+def cas_reponse_invalide():
+    remplir([{"nom": f"J{i}", "ean": f"05{i}"} for i in range(3)])
+
+    async def json_invalide(client, ean):
+        if ean == "051":
+            raise ValueError("Expecting value: line 1 column 1 (char 0)")
+        return {"source": "OpenFoodFacts", "nom": "J", "marque": "OFF", "description": "D"}
+
+    bl = FauxFournisseur("Barcodelookup", {"051": {"nom": "J", "marque": "BL", "description": "D"}})
+    liste = [("OpenFoodFacts", json_invalide, SeauJetons(1000, capacite=1000))] + fournisseurs(bl)
+    lancer(liste, taille_lot=2)
+    verifier(lire("051") == ("BL", "D"), "réponse illisible : repli sur le second fournisseur")
+    verifier(lire("050") == ("OFF", "D") and lire("052") == ("OFF", "D"), "les autres produits du lot sont enrichis")
+
+    # Aucun autre fournisseur : produit compté en erreur, le passage se termine
+    remplir([{"nom": "M", "ean": "051"}, {"nom": "N", "ean": "070"}])
+    stats = lancer([("OpenFoodFacts", json_invalide, SeauJetons(1000, capacite=1000))], taille_lot=1)
+    verifier(stats == {"traites": 2, "enrichis": 1, "introuvables": 0, "reportes": 0, "erreurs": 1},
+             f"erreur comptée, passage terminé ({stats})")
+
+def cas_reprise():
+    remplir([{"nom": f"R{i}", "ean": f"04{i}"} for i in range(6)])
+    connus = {f"04{i}": {"nom": "R", "marque": "M", "description": "D"} for i in range(6)}
+    off = FauxFournisseur("OpenFoodFacts", connus, panne_apres=3)
+    try:
+        lancer(fournisseurs(off), taille_lot=2, concurrence=1)
+    except asyncio.CancelledError:
+        pass
+    curseur = lire_curseur(SessionLocal)
+    verifier(curseur > 0, f"premier lot enregistré avant l'interruption (curseur {curseur})")
+
+    off = FauxFournisseur("OpenFoodFacts", connus)
+    lancer(fournisseurs(off), taille_lot=2)
+    verifier("040" not in off.appels and "041" not in off.appels, "reprise après le curseur, sans refaire le premier lot")
+    verifier(all(lire(f"04{i}") == ("M", "D") for i in range(6)), "tous les produits enrichis après reprise")
+
+def main():
+    initialiser_schema()
+    for cas in (cas_champs_vides, cas_reessai, cas_repli, cas_quota_epuise, cas_reponse_invalide, cas_reprise):
+        print(f"\n--- {cas.__name__} ---")
+        cas()
+
+    print()
+    if echecs:
+        print(f"❌ {len(echecs)} vérification(s) en échec")
+        sys.exit(1)
+    print("✅ Enrichissement vérifié")
+
+if __name__ == "__main__":
+    main()